@@ -1,9 +1,30 @@
-import jwt
-
 from rest_framework import authentication, exceptions
 
+from apps.authentication.cache import principal_cache
 from apps.authentication.models import User
-from innotter.settings import JWT_SECRET
+from apps.authentication.tokens import check_not_revoked, decode_token
+from innotter.settings import JWT_CHECK_ACCESS_REVOCATION
+
+
+class AuthContext:
+    """Verified token and its user, resolved once per request"""
+
+    def __init__(self, token, payload, user):
+        self.token = token
+        self.payload = payload
+        self.user = user
+
+    @classmethod
+    def from_token(cls, token):
+        payload = decode_token(token)
+        if JWT_CHECK_ACCESS_REVOCATION:
+            check_not_revoked(payload)
+
+        user = principal_cache.get(payload["user_id"])
+        if user is None:
+            user = principal_cache.load(payload["user_id"], payload["exp"])
+
+        return cls(token, payload, user)
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -28,20 +49,20 @@ class JWTAuthentication(authentication.BaseAuthentication):
         return self._authenticate_credentials(request, token)
 
     def _authenticate_credentials(self, request, token):
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        except Exception as e:
-            msg = "Authentication error. Cannot decode token"
-            raise exceptions.AuthenticationFailed(msg)
+        context = getattr(request, "auth_context", None)
 
-        try:
-            user = User.objects.get(pk=payload["user_id"])
-        except User.DoesNotExist:
-            msg = "User with this token not found."
-            raise exceptions.AuthenticationFailed(msg)
+        if context is None or context.token != token:
+            try:
+                context = AuthContext.from_token(token)
+            except User.DoesNotExist:
+                msg = "User with this token not found."
+                raise exceptions.AuthenticationFailed(msg)
+            except Exception as e:
+                msg = "Authentication error. Cannot decode token"
+                raise exceptions.AuthenticationFailed(msg)
 
-        if not user.is_active:
+        if not context.user.is_active:
             msg = "Current user is not acitve."
             raise exceptions.AuthenticationFailed(msg)
 
-        return (user, token)
+        return (context.user, token)
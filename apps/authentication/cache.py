@@ -0,0 +1,65 @@
+import time
+
+from django.core.cache import caches
+
+from apps.authentication.models import User
+from innotter.settings import (
+    AUTH_PRINCIPAL_CACHE_ALIAS,
+    AUTH_PRINCIPAL_CACHE_TTL,
+)
+
+# Everything authentication and permission checks read, never the password hash
+PRINCIPAL_FIELDS = (
+    "id", "username", "email", "role", "title", "is_active", "is_blocked", "is_staff", "is_superuser",
+)
+
+
+class PrincipalCache:
+    """
+    Authenticated users keyed by id in a shared Django cache, so a block or
+    role change invalidated by one worker is seen by all of them at once.
+    Only ``PRINCIPAL_FIELDS`` are cached, the other fields of a cached user
+    are deferred. Entries never outlive the token that loaded them.
+    """
+
+    key_prefix = "principal"
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}:{user_id}"
+
+    def get(self, user_id):
+        values = self.shared.get(self._key(user_id))
+        if values is None:
+            return None
+
+        # from_db takes the values in model field order
+        fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        return User.from_db("default", fields, [values[field] for field in fields])
+
+    def load(self, user_id, exp):
+        """The user from the database, cached until ``exp`` at the latest"""
+        user = User.objects.only(*PRINCIPAL_FIELDS).get(pk=user_id)
+
+        ttl = min(self.ttl, exp - time.time())
+        if ttl > 0:
+            values = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+            self.shared.set(self._key(user_id), values, timeout=ttl)
+
+        return user
+
+    def invalidate(self, *user_ids):
+        self.shared.delete_many([self._key(user_id) for user_id in user_ids])
+
+
+principal_cache = PrincipalCache(
+    alias=AUTH_PRINCIPAL_CACHE_ALIAS,
+    ttl=AUTH_PRINCIPAL_CACHE_TTL,
+)
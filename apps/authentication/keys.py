@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+
+from innotter.settings import (
+    JWT_KEYS_DIR,
+    JWT_KEYS_RELOAD_SECONDS,
+    JWT_SIGNING_KEY_ID,
+)
+
+try:
+    from cryptography.hazmat.primitives.asymmetric import ed448, ed25519, rsa
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+    from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+except ImportError:
+    rsa = None
+
+UNKNOWN_KID_RELOAD_SECONDS = 1
+
+
+class SigningKey:
+    """A parsed key of the keyset, with its public half used for verifying"""
+
+    def __init__(self, kid, key):
+        self.kid = kid
+
+        if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+            self.algorithm, self.jwk_class = "RS256", RSAAlgorithm
+        elif isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey,
+                              ed448.Ed448PrivateKey, ed448.Ed448PublicKey)):
+            self.algorithm, self.jwk_class = "EdDSA", OKPAlgorithm
+        else:
+            raise ImproperlyConfigured(f"JWT key {kid} is neither an RSA nor an EdDSA key")
+
+        self.private = key if hasattr(key, "public_key") else None
+        self.public = key.public_key() if self.private else key
+
+    @classmethod
+    def from_pem(cls, kid, data):
+        if b"PRIVATE KEY" in data:
+            return cls(kid, load_pem_private_key(data, password=None))
+        return cls(kid, load_pem_public_key(data))
+
+    def jwk(self):
+        return dict(json.loads(self.jwk_class.to_jwk(self.public)), kid=self.kid, alg=self.algorithm, use="sig")
+
+
+class KeySet:
+    """
+    Keys read from the ``<kid>.pem`` files of ``directory`` and kept parsed,
+    so tokens are verified without touching PEMs. The directory is rescanned
+    every ``reload_interval`` seconds, or right away for a token with an
+    unknown kid, and only changed files are parsed again.
+
+    Tokens are signed with ``signing_kid`` or, without it, the private key
+    with the greatest kid. To rotate, add the new key to every instance,
+    then sign with it; drop the old file once its tokens have expired.
+    """
+
+    def __init__(self, directory, signing_kid, reload_interval):
+        if rsa is None:
+            raise ImproperlyConfigured("JWT_KEYS_DIR requires the cryptography package")
+
+        self.directory = directory
+        self.signing_kid = signing_kid
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.keys = {}
+        self.versions = {}
+        self.loaded_at = 0
+
+    def load(self):
+        keys, versions = {}, {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".pem"):
+                continue
+
+            kid = name[:-len(".pem")]
+            path = os.path.join(self.directory, name)
+            versions[kid] = os.stat(path).st_mtime_ns
+            if self.versions.get(kid) == versions[kid]:
+                keys[kid] = self.keys[kid]
+            else:
+                with open(path, "rb") as file:
+                    keys[kid] = SigningKey.from_pem(kid, file.read())
+
+        self.keys, self.versions = keys, versions
+        self.loaded_at = time.monotonic()
+
+    def reload(self, after):
+        with self.lock:
+            if time.monotonic() - self.loaded_at >= after:
+                self.load()
+
+    def get(self, kid):
+        self.reload(self.reload_interval)
+        if kid not in self.keys:
+            self.reload(UNKNOWN_KID_RELOAD_SECONDS)
+
+        return self.keys.get(kid)
+
+    def signing_key(self):
+        self.reload(self.reload_interval)
+
+        if self.signing_kid:
+            key = self.keys.get(self.signing_kid)
+        else:
+            key = next((key for kid, key in sorted(self.keys.items(), reverse=True) if key.private), None)
+
+        if key is None or key.private is None:
+            raise ImproperlyConfigured(f"No private JWT signing key in {self.directory}")
+
+        return key
+
+    def jwks(self):
+        self.reload(self.reload_interval)
+
+        return {"keys": [key.jwk() for key in self.keys.values()]}
+
+
+keyset = KeySet(JWT_KEYS_DIR, JWT_SIGNING_KEY_ID, JWT_KEYS_RELOAD_SECONDS) if JWT_KEYS_DIR else None
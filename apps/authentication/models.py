@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 
 
@@ -13,3 +14,8 @@ class User(AbstractUser):
     role = models.CharField(max_length=9, choices=Roles.choices, default="user")
     title = models.CharField(max_length=80)
     is_blocked = models.BooleanField(default=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["id"], condition=Q(is_blocked=True), name="user_blocked_idx"),
+        ]
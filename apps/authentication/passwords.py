@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from rest_framework.exceptions import Throttled
+
+from innotter.settings import (
+    LOGIN_HASH_MAX_PENDING,
+    LOGIN_HASH_TIMEOUT,
+    LOGIN_HASH_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordCheck:
+    def __init__(self, valid, upgraded, queue_wait, hash_time):
+        self.valid = valid
+        self.upgraded = upgraded
+        self.queue_wait = queue_wait
+        self.hash_time = hash_time
+
+    def server_timing(self):
+        return f"queue;dur={self.queue_wait * 1000:.1f}, hash;dur={self.hash_time * 1000:.1f}"
+
+
+def verify_password(password, encoded, submitted_at):
+    """
+    Worker side of a check: verify ``password`` and, when ``encoded`` is not
+    hashed with the preferred PASSWORD_HASHERS entry, hash it again with that
+    one so the upgrade costs the request thread nothing.
+    """
+    started_at = time.time()
+    valid = check_password(password, encoded)
+
+    upgraded = None
+    if valid:
+        preferred = get_hasher()
+        current = identify_hasher(encoded)
+        if current.algorithm != preferred.algorithm or preferred.must_update(encoded):
+            upgraded = make_password(password)
+
+    return valid, upgraded, started_at - submitted_at, time.time() - started_at
+
+
+class PasswordCheckPool:
+    """
+    Runs password hashing on a per-process pool of ``workers`` processes so
+    a login burst cannot starve request threads. At most ``max_pending``
+    checks are queued or running, further logins are rejected at once with
+    429. A check that timed out keeps its slot until its worker is done
+    with it, so slow hashing cannot pile up behind the limit. With no
+    workers checks run inline.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.executor = None
+        self.metrics = {
+            "checks": 0,
+            "rejected": 0,
+            "upgraded": 0,
+            "queue_wait_seconds": 0.0,
+            "hash_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+        }
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup)
+        return self.executor
+
+    def check(self, password, encoded):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.metrics["rejected"] += 1
+                raise Throttled(wait=1, detail="Too many logins in progress, try again shortly.")
+            self.pending += 1
+
+        if self.workers:
+            result = self.run_in_pool(password, encoded)
+        else:
+            try:
+                result = verify_password(password, encoded, time.time())
+            finally:
+                self.release()
+
+        check = PasswordCheck(*result)
+        self.record(check)
+
+        return check
+
+    def run_in_pool(self, password, encoded):
+        with self.lock:
+            executor = self.get_executor()
+
+        try:
+            try:
+                future = executor.submit(verify_password, password, encoded, time.time())
+            except Exception:
+                self.release()
+                raise
+            future.add_done_callback(self.release)
+
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Only a check still queued can be dropped, a running one holds its slot until it ends
+            future.cancel()
+            raise Throttled(wait=1, detail="Login is taking too long, try again shortly.")
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            raise
+
+    def release(self, future=None):
+        with self.lock:
+            self.pending -= 1
+
+    def record(self, check):
+        with self.lock:
+            self.metrics["checks"] += 1
+            self.metrics["upgraded"] += check.upgraded is not None
+            self.metrics["queue_wait_seconds"] += check.queue_wait
+            self.metrics["hash_seconds"] += check.hash_time
+            self.metrics["max_queue_wait_seconds"] = max(self.metrics["max_queue_wait_seconds"], check.queue_wait)
+
+        logger.debug("Password check waited %.4fs, hashed in %.4fs", check.queue_wait, check.hash_time)
+
+
+password_checks = PasswordCheckPool(
+    workers=LOGIN_HASH_WORKERS,
+    max_pending=LOGIN_HASH_MAX_PENDING,
+    timeout=LOGIN_HASH_TIMEOUT,
+)
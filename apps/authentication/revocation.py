@@ -0,0 +1,163 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import caches
+
+from innotter.settings import (
+    JWT_REFRESH_TTL,
+    JWT_REVOCATION_BLOOM_CAPACITY,
+    JWT_REVOCATION_BLOOM_ERROR_RATE,
+    JWT_REVOCATION_CACHE_ALIAS,
+    JWT_REVOCATION_SYNC_SECONDS,
+)
+
+SYNC_BATCH_SIZE = 1000
+GAP_TIMEOUT = 5
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self.positions(value):
+            self.bits[position // 8] |= 1 << position % 8
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & 1 << position % 8 for position in self.positions(value))
+
+
+class RevocationIndex:
+    """
+    Revoked token ids in a shared Django cache, every entry kept for ``ttl``
+    seconds so nothing outlives the tokens it revokes. Each process keeps a
+    Bloom filter of the revoked ids in front, so the common "not revoked"
+    answer needs no cache round trip; only hits are confirmed in the cache.
+
+    Revocations reach other processes through an append-only log of cache
+    slots that every process reads at most once per ``sync_interval``. All
+    slots share one timeout, so they expire in the order they were written.
+    The cache has to be shared by all workers, see check_shared_caches.
+    """
+
+    key_prefix = "revoked"
+    used_prefix = "refresh-used"
+    count_key = "revocations:count"
+    slot_prefix = "revocations:slot"
+
+    def __init__(self, alias, ttl, capacity, error_rate, sync_interval):
+        self.alias = alias
+        self.ttl = ttl
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def reset(self):
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.previous = BloomFilter(self.capacity, self.error_rate)
+        self.rotated_at = time.time()
+        self.position = None
+        self.synced_at = 0
+        self.gap_since = None
+
+    def _key(self, token_id):
+        return f"{self.key_prefix}:{token_id}"
+
+    def _slot(self, number):
+        return f"{self.slot_prefix}:{number}"
+
+    def revoke(self, token_id):
+        if not self.shared.add(self._key(token_id), True, timeout=self.ttl):
+            return
+
+        self.shared.add(self.count_key, 0, timeout=None)
+        number = self.shared.incr(self.count_key)
+        self.shared.set(self._slot(number), token_id, timeout=self.ttl)
+
+        with self.lock:
+            self.current.add(token_id)
+
+    def is_revoked(self, token_id):
+        self.sync()
+
+        with self.lock:
+            maybe = token_id in self.current or token_id in self.previous
+
+        return maybe and self.shared.get(self._key(token_id)) is not None
+
+    def use_once(self, token_id):
+        """Whether this is the first use of ``token_id``, marking it used"""
+        return self.shared.add(f"{self.used_prefix}:{token_id}", True, timeout=self.ttl)
+
+    def sync(self):
+        now = time.time()
+        with self.lock:
+            if now - self.synced_at < self.sync_interval:
+                return
+            if now - self.synced_at > self.ttl:
+                self.position = None
+            self.synced_at = now
+            if now - self.rotated_at > self.ttl:
+                self.previous, self.current = self.current, BloomFilter(self.capacity, self.error_rate)
+                self.rotated_at = now
+
+            count = self.shared.get(self.count_key, 0)
+            if self.position is None or self.position > count:
+                self.position = self.first_live_slot(count) - 1
+
+            while self.position < count:
+                numbers = range(self.position + 1, min(count, self.position + SYNC_BATCH_SIZE) + 1)
+                slots = self.shared.get_many([self._slot(number) for number in numbers])
+
+                for number in numbers:
+                    token_id = slots.get(self._slot(number))
+                    if token_id is None:
+                        # A slot numbered but not written yet: wait for it a
+                        # little, then assume its writer died.
+                        self.gap_since = self.gap_since or now
+                        if now - self.gap_since < GAP_TIMEOUT:
+                            return
+                    else:
+                        self.current.add(token_id)
+                    self.gap_since = None
+                    self.position = number
+
+    def first_live_slot(self, count):
+        low, high = 1, count + 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.shared.get(self._slot(middle)) is None:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def clear(self):
+        """Drop the in-process filters, the shared cache is left untouched"""
+        with self.lock:
+            self.reset()
+
+
+revocations = RevocationIndex(
+    alias=JWT_REVOCATION_CACHE_ALIAS,
+    ttl=JWT_REFRESH_TTL,
+    capacity=JWT_REVOCATION_BLOOM_CAPACITY,
+    error_rate=JWT_REVOCATION_BLOOM_ERROR_RATE,
+    sync_interval=JWT_REVOCATION_SYNC_SECONDS,
+)
@@ -5,12 +5,13 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import get_user_model
 
-from datetime import datetime, timedelta
-
-from innotter.settings import (
-    JWT_SECRET,
-    JWT_ACCESS_TTL,
-    JWT_REFRESH_TTL,
+from apps.authentication.passwords import password_checks
+from apps.authentication.tokens import (
+    TokenRevoked,
+    decode_token,
+    issue_tokens,
+    revoke_token,
+    rotate_refresh_token,
 )
 
 User = get_user_model()
@@ -138,9 +139,15 @@ class LoginSerializer(serializers.Serializer):
         try:
             user = User.objects.get(email=validated_data["email"])
 
-            if not user.check_password(validated_data["password"]):
+            self.password_check = password_checks.check(validated_data["password"], user.password)
+            if not self.password_check.valid:
                 raise serializers.ValidationError(error_msg)
 
+            if self.password_check.upgraded:
+                User.objects.filter(pk=user.pk, password=user.password).update(
+                    password=self.password_check.upgraded
+                )
+
             validated_data["user"] = user
 
         except User.DoesNotExist:
@@ -150,28 +157,25 @@ class LoginSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         """Creating tokens for user"""
+        return issue_tokens(validated_data["user"].id)
 
-        access_payload = {
-            "iss": "backend-api",
-            "user_id": validated_data["user"].id,
-            "exp": datetime.utcnow() + timedelta(seconds=JWT_ACCESS_TTL),
-            "type": "access"
-        }
-        access = jwt.encode(payload=access_payload, key=JWT_SECRET)
 
-        refresh_payload = {
-            "iss": "backend-api",
-            "user_id": validated_data["user"].id,
-            "exp": datetime.utcnow() + timedelta(seconds=JWT_REFRESH_TTL),
-            "type": "refresh"
-        }
+def decode_refresh_token(token):
+    try:
+        payload = decode_token(token)
+        if payload["type"] != "refresh":
+            error_msg = {"refresh_token": "Token type is not refresh!"}
+            raise serializers.ValidationError(error_msg)
 
-        refresh = jwt.encode(payload=refresh_payload, key=JWT_SECRET)
+    except jwt.ExpiredSignatureError:
+        error_msg = {"refresh_token": "Refresh token is expired!"}
+        raise serializers.ValidationError(error_msg)
 
-        return {
-            "access": access,
-            "refresh": refresh
-        }
+    except jwt.InvalidTokenError:
+        error_msg = {"refresh_token": "Refresh token is invalid!"}
+        raise serializers.ValidationError(error_msg)
+
+    return payload
 
 
 class RefreshTokenSerializer(serializers.Serializer):
@@ -181,44 +185,30 @@ class RefreshTokenSerializer(serializers.Serializer):
 
     def validate(self, validated_data):
         validated_data = super().validate(validated_data)
+        payload = decode_refresh_token(validated_data["refresh_token"])
 
         try:
-            payload = jwt.decode(validated_data["refresh_token"], JWT_SECRET, algorithms=['HS256'])
-            if payload["type"] != "refresh":
-                error_msg = {"refresh_token": "Token type is not refresh!"}
-                raise serializers.ValidationError(error_msg)
-            validated_data["payload"] = payload
-
-        except jwt.ExpiredSignatureError:
-            error_msg = {"refresh_token": "Refresh token is expired!"}
-            raise serializers.ValidationError(error_msg)
-
-        except jwt.InvalidTokenError:
-            error_msg = {"refresh_token": "Refresh token is invalid!"}
-            raise serializers.ValidationError(error_msg)
+            validated_data["tokens"] = rotate_refresh_token(payload)
+        except TokenRevoked as e:
+            raise serializers.ValidationError({"refresh_token": str(e)})
 
         return validated_data
 
     def create(self, validated_data):
         """Creating tokens for user"""
-        access_payload = {
-            "iss": "backend-api",
-            "user_id": validated_data["payload"]["user_id"],
-            "exp": datetime.utcnow() + timedelta(seconds=JWT_ACCESS_TTL),
-            "type": "access"
-        }
-        access = jwt.encode(payload=access_payload, key=JWT_SECRET)
+        return validated_data["tokens"]
 
-        refresh_payload = {
-            "iss": "backend-api",
-            "user_id": validated_data["payload"]["user_id"],
-            "exp": datetime.utcnow() + timedelta(seconds=JWT_REFRESH_TTL),
-            "type": "refresh"
-        }
 
-        refresh = jwt.encode(payload=refresh_payload, key=JWT_SECRET)
+class RevokeTokenSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField(required=True, write_only=True)
 
-        return {
-            "access": access,
-            "refresh": refresh
-        }
+    def validate(self, validated_data):
+        validated_data = super().validate(validated_data)
+        validated_data["payload"] = decode_refresh_token(validated_data["refresh_token"])
+
+        return validated_data
+
+    def create(self, validated_data):
+        revoke_token(validated_data["payload"])
+
+        return {}
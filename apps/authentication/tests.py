@@ -1,11 +1,27 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
 import pytest
 import jwt
 
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import Throttled
 
 from apps.authentication.fixtures import auto_login_user
+from apps.authentication.backends import AuthContext
+from apps.authentication.cache import principal_cache
+from apps.authentication.keys import KeySet
+from apps.authentication.passwords import PasswordCheckPool, password_checks
+from apps.authentication.revocation import BloomFilter, RevocationIndex
+from innotter.caches import check_shared_caches
+from apps.authentication.tokens import TokenRevoked, decode_token, issue_tokens
 
 User = get_user_model()
 
@@ -128,3 +144,308 @@ def test_refresh_user_view(client, auto_login_user):
     )
     payload = jwt.decode(response.data["access"], key=settings.JWT_SECRET, algorithms=['HS256', ])
     assert payload["user_id"] == user.id
+
+
+@pytest.mark.django_db
+def test_token_verified_once_per_request(client, auto_login_user, django_assert_num_queries):
+    access_token, refresh_token, user = auto_login_user()
+
+    url = reverse("content:tags-list")
+    with django_assert_num_queries(2):
+        response = client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_authenticated_user_is_cached(client, auto_login_user, django_assert_num_queries):
+    access_token, refresh_token, user = auto_login_user()
+
+    url = reverse("content:tags-list")
+    client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+    with django_assert_num_queries(1):
+        response = client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.status_code == 200
+    assert "password" not in principal_cache.shared.get(principal_cache._key(user.id))
+    assert "password" in response.wsgi_request.user.get_deferred_fields()
+    assert response.wsgi_request.user.role == "admin"
+
+
+@pytest.mark.django_db
+def test_block_user_invalidates_cached_user(client, auto_login_user):
+    access_token, refresh_token, user = auto_login_user()
+
+    url = reverse("authentication:users-detail", kwargs={"pk": str(user.id)})
+    client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    block_url = reverse("authentication:users-block-user", kwargs={"id": str(user.id)})
+    client.post(block_url, HTTP_AUTHORIZATION="Token " + access_token)
+    response = client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.wsgi_request.user.is_blocked == True
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 1000])
+@pytest.mark.parametrize("url_name, budget", [
+    ("authentication:users-list", 2),
+    ("authentication:users-detail", 1),
+])
+def test_user_views_query_budget(client, auto_login_user, django_assert_max_num_queries, request_time_budget,
+                                 url_name, budget, size):
+    access_token, refresh_token, user = auto_login_user()
+    User.objects.bulk_create([
+        User(username=f"budget_user_{i}", email=f"budget_user_{i}@gmail.com", role="user")
+        for i in range(size)
+    ])
+    kwargs = {"pk": str(user.id)} if url_name == "authentication:users-detail" else {}
+    url = reverse(url_name, kwargs=kwargs)
+    client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    with django_assert_max_num_queries(budget), request_time_budget():
+        response = client.get(url, {}, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 1000])
+def test_token_views_query_budget(client, auto_login_user, django_assert_max_num_queries, request_time_budget,
+                                  size):
+    access_token, refresh_token, user = auto_login_user()
+    User.objects.bulk_create([
+        User(username=f"budget_user_{i}", email=f"budget_user_{i}@gmail.com", role="user")
+        for i in range(size)
+    ])
+
+    with django_assert_max_num_queries(1):
+        login = client.post(reverse("authentication:login"), data={"email": user.email, "password": "123"})
+    with django_assert_max_num_queries(0), request_time_budget():
+        refresh = client.post(reverse("authentication:refresh"), data={"refresh_token": refresh_token})
+
+    assert login.status_code == 202
+    assert refresh.status_code == 202
+
+
+@pytest.mark.django_db
+def test_login_checks_password_off_request_thread(client):
+    user = User.objects.create_user(username="pooluser", email="pool_user@gmail.com", password="123", role="user")
+    checks = password_checks.metrics["checks"]
+
+    response = client.post(reverse("authentication:login"), data={"email": user.email, "password": "123"})
+    wrong = client.post(reverse("authentication:login"), data={"email": user.email, "password": "1234"})
+
+    assert response.status_code == 202
+    assert response["Server-Timing"].startswith("queue;dur=")
+    assert wrong.status_code == 400
+    assert password_checks.metrics["checks"] == checks + 2
+
+
+@pytest.mark.django_db
+def test_login_rejected_when_password_checks_saturated(client, monkeypatch):
+    user = User.objects.create_user(username="busyuser", email="busy_user@gmail.com", password="123", role="user")
+    monkeypatch.setattr(password_checks, "max_pending", 0)
+
+    response = client.post(reverse("authentication:login"), data={"email": user.email, "password": "123"})
+
+    assert response.status_code == 429
+
+
+def test_timed_out_password_check_keeps_its_slot():
+    pool = PasswordCheckPool(workers=1, max_pending=1, timeout=30)
+    slow = PBKDF2PasswordHasher().encode("123", "salt", iterations=3_000_000)
+    assert pool.check("123", PBKDF2PasswordHasher().encode("123", "salt", iterations=1)).valid
+
+    pool.timeout = 0.05
+    with pytest.raises(Throttled, match="too long"):
+        pool.check("123", slow)
+    with pytest.raises(Throttled, match="Too many"):
+        pool.check("123", slow)
+
+    deadline = time.monotonic() + 30
+    while pool.pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    pool.executor.shutdown()
+
+    assert pool.pending == 0
+    assert pool.metrics["rejected"] == 1
+
+
+@pytest.mark.django_db
+def test_login_upgrades_password_hash(client):
+    user = User.objects.create_user(username="olduser", email="old_user@gmail.com", role="user")
+    User.objects.filter(pk=user.pk).update(password=make_password("123", hasher="pbkdf2_sha1"))
+
+    response = client.post(reverse("authentication:login"), data={"email": user.email, "password": "123"})
+    user.refresh_from_db()
+
+    assert response.status_code == 202
+    assert user.password.startswith("pbkdf2_sha256$")
+    assert user.check_password("123")
+
+
+@pytest.mark.django_db
+def test_refresh_rotates_and_detects_reuse(client, auto_login_user):
+    access_token, refresh_token, user = auto_login_user()
+    url = reverse("authentication:refresh")
+
+    rotated = client.post(url, data={"refresh_token": refresh_token})
+    reused = client.post(url, data={"refresh_token": refresh_token})
+    after_reuse = client.post(url, data={"refresh_token": rotated.data["refresh"]})
+
+    family = jwt.decode(refresh_token, key=settings.JWT_SECRET, algorithms=['HS256', ])["family"]
+    assert rotated.status_code == 202
+    assert jwt.decode(rotated.data["refresh"], key=settings.JWT_SECRET, algorithms=['HS256', ])["family"] == family
+    assert reused.status_code == 400
+    assert after_reuse.status_code == 400
+
+
+@pytest.mark.django_db
+def test_revoke_token_view(client, auto_login_user, monkeypatch):
+    access_token, refresh_token, user = auto_login_user()
+
+    response = client.post(reverse("authentication:revoke"), data={"refresh_token": refresh_token})
+    refresh = client.post(reverse("authentication:refresh"), data={"refresh_token": refresh_token})
+
+    assert response.status_code == 202
+    assert refresh.status_code == 400
+    assert AuthContext.from_token(access_token).user == user
+
+    monkeypatch.setattr("apps.authentication.backends.JWT_CHECK_ACCESS_REVOCATION", True)
+    with pytest.raises(TokenRevoked):
+        AuthContext.from_token(access_token)
+
+
+def revoke_in_worker():
+    index = RevocationIndex("shared", ttl=60, capacity=100, error_rate=0.01, sync_interval=0)
+    index.revoke("family-1")
+    assert index.use_once("refresh-1")
+
+
+def test_revocations_reach_other_processes(settings, tmp_path):
+    settings.CACHES = {
+        **settings.CACHES,
+        "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)},
+    }
+    index = RevocationIndex("shared", ttl=60, capacity=100, error_rate=0.01, sync_interval=0)
+    assert not index.is_revoked("family-1")
+
+    worker = multiprocessing.get_context("fork").Process(target=revoke_in_worker)
+    worker.start()
+    worker.join()
+
+    assert worker.exitcode == 0
+    assert index.is_revoked("family-1")
+    assert not index.is_revoked("family-2")
+    assert not index.use_once("refresh-1")
+
+
+def test_shared_state_refuses_per_process_cache(settings, tmp_path):
+    settings.DEBUG = False
+    with pytest.raises(ImproperlyConfigured):
+        check_shared_caches()
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)},
+    }
+    check_shared_caches()
+
+    settings.REPLICA_DATABASES = ["replica_0"]
+    settings.REPLICA_STICKY_CACHE_ALIAS = "sticky"
+    settings.CACHES = dict(settings.CACHES, sticky={"BACKEND": "django.core.cache.backends.locmem.LocMemCache"})
+    with pytest.raises(ImproperlyConfigured, match="pinned to the primary"):
+        check_shared_caches()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    values = [str(i) for i in range(1000)]
+    for value in values:
+        bloom.add(value)
+
+    assert all(value in bloom for value in values)
+    assert sum(str(i) in bloom for i in range(1000, 11000)) < 300
+
+
+def write_private_key(directory, kid, key):
+    from cryptography.hazmat.primitives import serialization
+
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    (directory / f"{kid}.pem").write_bytes(pem)
+
+
+def test_tokens_signed_with_keyset_and_rotated(tmp_path, monkeypatch):
+    pytest.importorskip("cryptography")
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    write_private_key(tmp_path, "2022-01", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    keyset = KeySet(str(tmp_path), None, reload_interval=0)
+    monkeypatch.setattr("apps.authentication.tokens.keyset", keyset)
+
+    old = issue_tokens(1)["access"]
+    old_key = keyset.keys["2022-01"]
+    write_private_key(tmp_path, "2022-02", ed25519.Ed25519PrivateKey.generate())
+    new = issue_tokens(1)["access"]
+
+    assert jwt.get_unverified_header(old) == {"alg": "RS256", "kid": "2022-01", "typ": "JWT"}
+    assert jwt.get_unverified_header(new)["kid"] == "2022-02"
+    assert decode_token(old)["user_id"] == 1
+    assert decode_token(new)["user_id"] == 1
+    assert keyset.keys["2022-01"] is old_key
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_token(jwt.encode({"user_id": 1}, "secret", headers={"kid": "2021-12"}))
+
+    hs256 = jwt.encode({"user_id": 1}, settings.JWT_SECRET)
+    assert decode_token(hs256)["user_id"] == 1
+    monkeypatch.setattr("apps.authentication.tokens.JWT_ACCEPT_HS256", False)
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_token(hs256)
+
+
+def test_jwks_verifies_tokens_offline(client, tmp_path, monkeypatch):
+    pytest.importorskip("cryptography")
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    write_private_key(tmp_path, "2022-01", ed25519.Ed25519PrivateKey.generate())
+    keyset = KeySet(str(tmp_path), None, reload_interval=60)
+    monkeypatch.setattr("apps.authentication.tokens.keyset", keyset)
+    monkeypatch.setattr("apps.authentication.views.keyset", keyset)
+    token = issue_tokens(1)["access"]
+
+    response = client.get(reverse("authentication:jwks"))
+    jwk, = response.json()["keys"]
+
+    assert "d" not in jwk
+    assert jwk["kid"] == "2022-01"
+    assert jwt.decode(token, jwt.PyJWK(jwk).key, algorithms=[jwk["alg"]])["user_id"] == 1
+
+
+def test_jwks_empty_without_keyset(client):
+    response = client.get(reverse("authentication:jwks"))
+
+    assert response.status_code == 200
+    assert response.json() == {"keys": []}
+
+
+def import_settings(**env):
+    env = {
+        **{name: value for name, value in os.environ.items() if not name.startswith("JWT_") and name != "DEBUG"},
+        "SECRET_KEY": "x",
+        "ALLOWED_HOSTS": "x",
+        **env,
+    }
+    return subprocess.run(
+        [sys.executable, "-c", "import innotter.settings as s; print(s.JWT_ACCEPT_HS256)"],
+        env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+
+
+def test_jwt_secret_required_outside_debug(tmp_path):
+    assert "ImproperlyConfigured" in import_settings().stderr
+    assert "ImproperlyConfigured" in import_settings(JWT_KEYS_DIR=str(tmp_path), JWT_ACCEPT_HS256="true").stderr
+    assert import_settings(DEBUG="true").stdout.strip() == "True"
+    assert import_settings(JWT_SECRET="s3cret").stdout.strip() == "True"
+    assert import_settings(JWT_KEYS_DIR=str(tmp_path)).stdout.strip() == "False"
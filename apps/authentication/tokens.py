@@ -0,0 +1,97 @@
+import uuid
+
+import jwt
+
+from datetime import datetime, timedelta
+
+from apps.authentication.keys import keyset
+from apps.authentication.revocation import revocations
+from innotter.settings import (
+    JWT_SECRET,
+    JWT_ACCESS_TTL,
+    JWT_REFRESH_TTL,
+    JWT_ACCEPT_HS256,
+)
+
+
+class TokenRevoked(Exception):
+    pass
+
+
+class TokenReused(TokenRevoked):
+    pass
+
+
+def encode_token(user_id, family, token_type, ttl):
+    payload = {
+        "iss": "backend-api",
+        "user_id": user_id,
+        "exp": datetime.utcnow() + timedelta(seconds=ttl),
+        "type": token_type,
+        "jti": uuid.uuid4().hex,
+        "family": family,
+    }
+
+    if keyset is None:
+        return jwt.encode(payload=payload, key=JWT_SECRET)
+
+    key = keyset.signing_key()
+    return jwt.encode(payload=payload, key=key.private, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
+def decode_token(token):
+    """
+    Payload of a token signed by a keyset key named in its ``kid`` header,
+    or of an HS256 token without one
+    """
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is None:
+        if keyset is not None and not JWT_ACCEPT_HS256:
+            raise jwt.InvalidTokenError("HS256 tokens are not accepted")
+        return jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+
+    key = keyset.get(kid) if keyset is not None else None
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown signing key {kid}")
+
+    return jwt.decode(token, key.public, algorithms=[key.algorithm])
+
+
+def issue_tokens(user_id, family=None):
+    """
+    An access and refresh token pair. Tokens rotated from one login share
+    its ``family``, so revoking the family ends the whole session.
+    """
+    family = family or uuid.uuid4().hex
+
+    return {
+        "access": encode_token(user_id, family, "access", JWT_ACCESS_TTL),
+        "refresh": encode_token(user_id, family, "refresh", JWT_REFRESH_TTL),
+    }
+
+
+def check_not_revoked(payload):
+    family = payload.get("family")
+    if family and revocations.is_revoked(family):
+        raise TokenRevoked("Token is revoked!")
+
+
+def rotate_refresh_token(payload):
+    """
+    Spend a refresh token, which works only once. Presenting it again means
+    it was stolen, so its family is revoked for the thief and the owner alike.
+    """
+    check_not_revoked(payload)
+
+    jti = payload.get("jti")
+    if jti and not revocations.use_once(jti):
+        revocations.revoke(payload["family"])
+        raise TokenReused("Refresh token was already used!")
+
+    return issue_tokens(payload["user_id"], family=payload.get("family"))
+
+
+def revoke_token(payload):
+    family = payload.get("family")
+    if family:
+        revocations.revoke(family)
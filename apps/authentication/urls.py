@@ -6,6 +6,8 @@ from apps.authentication.views import (
     UserViewSet,
     LoginView,
     RefreshTokenView,
+    RevokeTokenView,
+    JWKSView,
 )
 
 app_name = "authentication"
@@ -17,5 +19,7 @@ router.register(r"users", UserViewSet, basename="users")
 urlpatterns = [
     path("", include(router.urls), name="users"),
     path("login/", LoginView.as_view(), name="login"),
-    path("refresh/", RefreshTokenView.as_view(), name="refresh")
+    path("refresh/", RefreshTokenView.as_view(), name="refresh"),
+    path("revoke/", RevokeTokenView.as_view(), name="revoke"),
+    path(".well-known/jwks.json", JWKSView.as_view(), name="jwks"),
 ]
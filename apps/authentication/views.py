@@ -15,8 +15,13 @@ from apps.authentication.serializers import (
     UserCreateSerializer,
     LoginSerializer,
     RefreshTokenSerializer,
+    RevokeTokenSerializer,
 )
 from apps.authentication.backends import JWTAuthentication
+from apps.authentication.cache import principal_cache
+from apps.authentication.keys import keyset
+from innotter.db.replicas import ReplicaReadMixin
+from innotter.settings import JWT_KEYS_RELOAD_SECONDS
 
 from django.shortcuts import get_object_or_404
 
@@ -31,6 +36,7 @@ class IsAuthenticated(BasePermission):
 
 
 class UserViewSet(
+    ReplicaReadMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -55,20 +61,21 @@ class UserViewSet(
         serializer = self.get_serializer(data=request.data, instance=user)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        principal_cache.invalidate(user.id)
 
         return Response(serializer.validated_data, status=status.HTTP_202_ACCEPTED)
 
     def delete(self, request, pk=None):
         user = get_object_or_404(User, pk=pk)
         user.delete()
+        principal_cache.invalidate(pk)
 
         return Response(status=status.HTTP_202_ACCEPTED)
 
     @action(methods=['POST', ], url_path="block-user/(?P<id>[0-9]+)", url_name="block-user", detail=False)
     def block_user(self, request, id=None):
-        user = User.objects.get(pk=id)
-        user.is_blocked = True
-        user.save()
+        User.objects.filter(pk=id).update(is_blocked=True)
+        principal_cache.invalidate(id)
 
         return Response(status=status.HTTP_202_ACCEPTED)
 
@@ -82,7 +89,11 @@ class LoginView(mixins.CreateModelMixin, generics.GenericAPIView):
         serializer.is_valid(raise_exception=True)
         response_data = serializer.save()
 
-        return Response(response_data, status=status.HTTP_202_ACCEPTED)
+        return Response(
+            response_data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Server-Timing": serializer.password_check.server_timing()},
+        )
 
 
 class RefreshTokenView(mixins.ListModelMixin, generics.GenericAPIView):
@@ -94,3 +105,26 @@ class RefreshTokenView(mixins.ListModelMixin, generics.GenericAPIView):
         serializer.is_valid(raise_exception=True)
         response_data = serializer.save()
         return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+
+class RevokeTokenView(generics.GenericAPIView):
+    queryset = User.objects.all()
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        serializer = RevokeTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+class JWKSView(generics.GenericAPIView):
+    """Public keys that verify our tokens, for services checking them offline"""
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+
+    def get(self, request):
+        jwks = keyset.jwks() if keyset is not None else {"keys": []}
+
+        return Response(jwks, headers={"Cache-Control": f"public, max-age={JWT_KEYS_RELOAD_SECONDS}"})
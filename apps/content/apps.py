@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ContentConfig(AppConfig):
+    name = "apps.content"
+
+    def ready(self):
+        from apps.content import signals  # noqa: F401
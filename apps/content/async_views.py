@@ -0,0 +1,108 @@
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.request import Request
+
+from apps.content.pagination import KeysetPagination
+from apps.content.serializers import (
+    PostListSerializer,
+    PageRetrieveSerializer,
+)
+from apps.content.views import (
+    PostViewSet,
+    PageViewSet,
+    paginate_followed_pages_posts,
+)
+from innotter.db.replicas import is_pinned_to_primary, read_from_replica
+from innotter.settings import ASYNC_DB_THREADS
+
+db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix="async-db")
+
+
+def run_in_db_thread(func, *args, replica=False, **kwargs):
+    token = read_from_replica.set(replica)
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+        read_from_replica.reset(token)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run ORM work on the bounded executor so the event loop never blocks on the database"""
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(db_executor, functools.partial(run_in_db_thread, func, *args, **kwargs))
+
+
+def async_read_view(read, fallback, replica=False):
+    """
+    Serve GET requests from ``read`` on the database executor and hand every
+    other method to the synchronous DRF ``fallback`` view. With ``replica``
+    the reads go to a replica unless the user has just written something.
+    """
+    fallback = sync_to_async(fallback)
+
+    async def view(request, *args, **kwargs):
+        if request.method != "GET":
+            return await fallback(request, *args, **kwargs)
+
+        context = getattr(request, "auth_context", None)
+        if context is None or not context.user.is_active:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+
+        use_replica = replica and not is_pinned_to_primary(context.user.id)
+        data = await run_db(read, Request(request), context.user, *args, replica=use_replica, **kwargs)
+
+        return JsonResponse(data)
+
+    view.csrf_exempt = True
+
+    return view
+
+
+def read_post_list(request, user):
+    paginator = LimitOffsetPagination()
+    posts = paginator.paginate_queryset(PostViewSet.querysets["list"].all(), request)
+
+    return paginator.get_paginated_response(PostListSerializer(posts, many=True).data).data
+
+
+def read_followed_pages_posts(request, user):
+    paginator = KeysetPagination()
+    posts = paginate_followed_pages_posts(
+        PostViewSet.querysets["list_followed_pages_posts"].all(), user.id, paginator, request
+    )
+
+    return paginator.get_paginated_response(PostListSerializer(posts, many=True).data).data
+
+
+def read_page(request, user, pk):
+    page = get_object_or_404(PageViewSet.querysets["retrieve"].all(), pk=pk)
+
+    return PageRetrieveSerializer(page).data
+
+
+post_list = async_read_view(
+    read_post_list,
+    PostViewSet.as_view({"get": "list", "post": "create"}),
+    replica=True,
+)
+followed_pages_posts = async_read_view(
+    read_followed_pages_posts,
+    PostViewSet.as_view({"get": "list_followed_pages_posts"}, **PostViewSet.list_followed_pages_posts.kwargs),
+)
+page_detail = async_read_view(
+    read_page,
+    PageViewSet.as_view({"get": "retrieve", "put": "update", "patch": "partial_update"}),
+    replica=True,
+)
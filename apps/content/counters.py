@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.content.models import Page, Post, Tag
+
+
+def count_rows(model, field):
+    """Correlated COUNT of ``model`` rows pointing at the outer row through ``field``"""
+    counts = model.objects.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(
+        total=Count("*")
+    ).values("total")
+
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def actual_page_counters():
+    return {
+        "followers_count": count_rows(Page.followers.through, "page_id"),
+        "follow_requests_count": count_rows(Page.follow_requests.through, "page_id"),
+        "posts_count": count_rows(Post, "page_id"),
+    }
+
+
+def adjust_page_counters(page_id, **deltas):
+    """Atomically shift counter columns of a page, e.g. followers_count=1"""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        Page.objects.filter(pk=page_id).update(**changes)
+
+
+def adjust_tag_counters(deltas):
+    """Atomically shift pages_count of tags by ``{tag_id: delta}``, one UPDATE per distinct delta"""
+    tags_by_delta = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            tags_by_delta[delta].append(tag_id)
+
+    for delta, tag_ids in tags_by_delta.items():
+        Tag.objects.filter(pk__in=tag_ids).update(pages_count=F("pages_count") + delta)
+
+
+def reconcile_page_counters(batch_size=1000):
+    """Recount every page whose counters drifted, returns the number fixed"""
+    actual = actual_page_counters()
+    drifted = Page.objects.annotate(
+        **{f"actual_{field}": expression for field, expression in actual.items()}
+    ).filter(
+        ~Q(followers_count=F("actual_followers_count"))
+        | ~Q(follow_requests_count=F("actual_follow_requests_count"))
+        | ~Q(posts_count=F("actual_posts_count"))
+    ).values_list("pk", flat=True)
+
+    fixed = 0
+    batch = []
+    for page_id in drifted.iterator(chunk_size=batch_size):
+        batch.append(page_id)
+        if len(batch) == batch_size:
+            fixed += Page.objects.filter(pk__in=batch).update(**actual)
+            batch = []
+    if batch:
+        fixed += Page.objects.filter(pk__in=batch).update(**actual)
+
+    return fixed
+
+
+def reconcile_tag_counters():
+    """Recount every tag whose pages_count drifted, returns the number fixed"""
+    actual = count_rows(Page.tags.through, "tag_id")
+
+    return Tag.objects.annotate(actual_pages_count=actual).filter(
+        ~Q(pages_count=F("actual_pages_count"))
+    ).update(pages_count=actual)
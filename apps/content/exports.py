@@ -0,0 +1,139 @@
+import asyncio
+import csv
+import queue
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.http import StreamingHttpResponse
+
+from innotter.settings import EXPORT_CHUNK_SIZE
+
+WRITE_SIZE = 64 * 1024
+HANDOFF_SIZE = 4
+DONE = object()
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+OUTPUTS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def buffered(lines, size=WRITE_SIZE):
+    """Join lines into chunks of about ``size`` characters so the server writes fewer, larger blocks"""
+    chunk = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class ThreadedChunks:
+    """
+    Chunks of a streaming response body. Django's ASGI handler iterates
+    streaming responses on the event loop, where the ORM refuses to run, so
+    there the chunks are produced on a thread of their own that stays up to
+    ``size`` chunks ahead. Under WSGI they are produced in place.
+
+    This only keeps ASGI exports working, not concurrent: the handler still
+    waits for every chunk on the event loop, stalling the other connections
+    of the worker for each fetch. Serve exports from WSGI workers.
+    """
+
+    def __init__(self, chunks, size=HANDOFF_SIZE):
+        self.chunks = chunks
+        self.size = size
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        if not in_event_loop():
+            yield from self.chunks
+            return
+
+        handoff = queue.Queue(maxsize=self.size)
+        threading.Thread(target=self.produce, args=(handoff,), name="export", daemon=True).start()
+        while True:
+            item = handoff.get()
+            if item is DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def produce(self, handoff):
+        try:
+            for chunk in self.chunks:
+                if not self.put(handoff, chunk):
+                    return
+            self.put(handoff, DONE)
+        except Exception as e:
+            self.put(handoff, e)
+        finally:
+            connections.close_all()
+
+    def put(self, handoff, item):
+        """Hand ``item`` over unless the response was closed, as when the client went away"""
+        while not self.closed.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def close(self):
+        self.closed.set()
+
+
+def export_response(queryset, columns, output, filename):
+    """
+    Stream ``queryset`` as NDJSON or CSV. ``columns`` maps output column
+    names to value lookups; rows are fetched with a chunked iterator and
+    rendered lazily, so memory use does not grow with the export size.
+    Under ASGI a running export blocks its worker's event loop, see
+    ``ThreadedChunks``.
+    """
+    render, content_type = OUTPUTS[output]
+    rows = queryset.values_list(*columns.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    response = StreamingHttpResponse(
+        ThreadedChunks(buffered(render(list(columns), rows))), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{output}"'
+
+    return response
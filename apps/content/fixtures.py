@@ -1,6 +1,7 @@
 import pytest
 
-from apps.content.models import Page
+from apps.content.counters import adjust_page_counters, reconcile_page_counters, reconcile_tag_counters
+from apps.content.models import Page, Post, Tag
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -31,7 +32,45 @@ def page_fixture(db, client):
                 password="123",
             )
         )
-        page.save()
+        adjust_page_counters(page.id, followers_count=1, follow_requests_count=1)
+        page.refresh_from_db()
         return page
 
     return create_page
+
+
+@pytest.fixture
+def seeded_page_fixture(db, page_fixture):
+    def seed_page(user_instance, size):
+        page = page_fixture(user_instance=user_instance)
+
+        User.objects.bulk_create([
+            User(username=f"seeded_user_{i}", email=f"seeded_user_{i}@gmail.com", role="user")
+            for i in range(size)
+        ])
+        users = list(User.objects.filter(username__startswith="seeded_user_"))
+        Page.followers.through.objects.bulk_create(
+            [Page.followers.through(page_id=page.id, user_id=user.id) for user in users[:size // 2 + 1]]
+            + [Page.followers.through(page_id=page.id, user_id=user_instance.id)]
+        )
+        Page.follow_requests.through.objects.bulk_create(
+            [Page.follow_requests.through(page_id=page.id, user_id=user.id) for user in users[size // 2 + 1:]]
+        )
+
+        Tag.objects.bulk_create([Tag(name=f"seeded tag {i}") for i in range(size)])
+        Page.tags.through.objects.bulk_create([
+            Page.tags.through(page_id=page.id, tag_id=tag_id)
+            for tag_id in Tag.objects.filter(name__startswith="seeded tag").values_list("id", flat=True)
+        ])
+
+        Page.objects.bulk_create([
+            Page(name=f"seeded page {i}", description="", owner=user_instance) for i in range(size)
+        ])
+        Post.objects.bulk_create([Post(page=page, content=f"seeded post {i}") for i in range(size)])
+
+        reconcile_page_counters()
+        reconcile_tag_counters()
+        page.refresh_from_db()
+        return page
+
+    return seed_page
@@ -0,0 +1,287 @@
+import codecs
+import json
+
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.content.counters import adjust_page_counters
+from apps.content.models import Page, Post, Tag
+from apps.content.search import search_index
+from apps.content.serializers import PageImportSerializer, PostImportSerializer, REPLY_TO_OTHER_PAGE
+from apps.content.tagging import attach_tags, get_or_create_tags
+from apps.content.threads import thread_store
+from apps.content.timelines import timeline_store
+from innotter.settings import IMPORT_MAX_ERRORS
+
+User = get_user_model()
+
+READ_SIZE = 64 * 1024
+
+
+class PrefixedStream:
+    """A byte stream with an already consumed ``prefix`` put back in front"""
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if self.prefix:
+            data, self.prefix = self.prefix, b""
+            return data
+        return self.stream.read(size)
+
+
+def iter_lines(stream):
+    pending = b""
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(stream):
+    for number, line in enumerate(iter_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+def iter_json_array(stream):
+    """Items of a JSON array decoded while the stream is read, a ValueError ends a malformed one"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    index = 0
+
+    def read_more():
+        nonlocal buffer, index
+        data = stream.read(READ_SIZE)
+        buffer = buffer[index:] + utf8.decode(data, final=not data)
+        index = 0
+        return bool(data)
+
+    def next_char():
+        nonlocal index
+        while True:
+            while index < len(buffer) and buffer[index].isspace():
+                index += 1
+            if index < len(buffer):
+                return buffer[index]
+            if not read_more():
+                return ""
+
+    if next_char() != "[":
+        raise ValueError("Expected a JSON array")
+    index += 1
+
+    number = 0
+    while True:
+        char = next_char()
+        if char == "]":
+            return
+        if number:
+            if char != ",":
+                raise ValueError(f"Expected ',' after record {number}")
+            index += 1
+            next_char()
+
+        while True:
+            try:
+                record, index = decoder.raw_decode(buffer, index)
+                break
+            except ValueError:
+                if not read_more():
+                    raise ValueError(f"Record {number + 1} is not valid JSON")
+
+        number += 1
+        yield number, record
+
+
+def iter_records(stream):
+    """(number, record) pairs of a JSON array or NDJSON byte stream"""
+    head = stream.read(READ_SIZE)
+    stream = PrefixedStream(head, stream)
+
+    if head.lstrip()[:1] == b"[":
+        return iter_json_array(stream)
+    return iter_ndjson(stream)
+
+
+class Importer:
+    """
+    Validates streamed records chunk by chunk and writes the valid ones of
+    every chunk with bulk_create in one transaction. Invalid records are
+    reported by their position in the stream and never stop the import.
+    ``owner_id`` limits the import to content of that user.
+    """
+
+    serializer_class = None
+
+    def __init__(self, batch_size, owner_id=None):
+        self.batch_size = batch_size
+        self.owner_id = owner_id
+
+    def run(self, records):
+        self.report = {"created": 0, "failed": 0, "errors": []}
+
+        for chunk in self.chunks(records):
+            rows = []
+            for number, record in chunk:
+                if isinstance(record, Exception):
+                    self.reject(number, {"non_field_errors": [str(record)]})
+                    continue
+
+                serializer = self.serializer_class(data=record)
+                if serializer.is_valid():
+                    rows.append((number, serializer.validated_data))
+                else:
+                    self.reject(number, serializer.errors)
+
+            rows = self.check(rows)
+            if rows:
+                with transaction.atomic():
+                    self.report["created"] += self.write([data for number, data in rows])
+
+        return self.report
+
+    def chunks(self, records):
+        chunk = []
+        try:
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == self.batch_size:
+                    yield chunk
+                    chunk = []
+        except ValueError as e:
+            self.reject(None, {"non_field_errors": [str(e)]})
+        if chunk:
+            yield chunk
+
+    def reject(self, number, errors):
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < IMPORT_MAX_ERRORS:
+            self.report["errors"].append({"record": number, "errors": errors})
+
+    def check(self, rows):
+        """Valid rows whose references exist, looked up with one query per kind for the whole chunk"""
+        return rows
+
+    def write(self, rows):
+        raise NotImplementedError
+
+
+class PostImporter(Importer):
+    serializer_class = PostImportSerializer
+
+    def check(self, rows):
+        pages = Page.objects.filter(pk__in={data["page"] for number, data in rows})
+        if self.owner_id is not None:
+            pages = pages.filter(owner_id=self.owner_id)
+        page_ids = set(pages.values_list("pk", flat=True))
+
+        reply_to_ids = {data["reply_to"] for number, data in rows if data.get("reply_to")}
+        reply_to_pages = {}
+        if reply_to_ids:
+            reply_to_pages = dict(Post.objects.filter(pk__in=reply_to_ids).values_list("pk", "page_id"))
+
+        checked = []
+        for number, data in rows:
+            if data["page"] not in page_ids:
+                self.reject(number, {"page": ["Page does not exist or is not yours."]})
+            elif data.get("reply_to") and data["reply_to"] not in reply_to_pages:
+                self.reject(number, {"reply_to": ["Post does not exist."]})
+            elif data.get("reply_to") and reply_to_pages[data["reply_to"]] != data["page"]:
+                self.reject(number, {"reply_to": [REPLY_TO_OTHER_PAGE]})
+            else:
+                checked.append((number, data))
+
+        return checked
+
+    def write(self, rows):
+        posts = Post.objects.bulk_create(
+            [Post(page_id=data["page"], content=data["content"], reply_to_id=data.get("reply_to")) for data in rows],
+            batch_size=self.batch_size,
+        )
+
+        posts_per_page = Counter(post.page_id for post in posts)
+        for page_id, count in posts_per_page.items():
+            adjust_page_counters(page_id, posts_count=count)
+            timeline_store.drop_page(page_id)
+        for reply_to_id in {post.reply_to_id for post in posts if post.reply_to_id}:
+            thread_store.invalidate(reply_to_id)
+
+        post_ids = [post.pk for post in posts]
+        if None in post_ids:
+            search_index.invalidate(Post)
+        else:
+            search_index.update(Post, *post_ids)
+
+        return len(posts)
+
+
+class PageImporter(Importer):
+    serializer_class = PageImportSerializer
+
+    def check(self, rows):
+        owner_ids = {data["owner"] for number, data in rows if "owner" in data}
+        if owner_ids:
+            owner_ids = set(User.objects.filter(pk__in=owner_ids).values_list("pk", flat=True))
+        tag_ids = {tag_id for number, data in rows for tag_id in data.get("tags", ())}
+        if tag_ids:
+            tag_ids = set(Tag.objects.filter(pk__in=tag_ids).values_list("pk", flat=True))
+
+        checked = []
+        for number, data in rows:
+            owner_id = data.get("owner", self.owner_id)
+            if owner_id is None:
+                self.reject(number, {"owner": ["This field is required."]})
+            elif self.owner_id is not None and owner_id != self.owner_id:
+                self.reject(number, {"owner": ["Pages can only be imported for yourself."]})
+            elif self.owner_id is None and owner_id not in owner_ids:
+                self.reject(number, {"owner": ["User does not exist."]})
+            elif not set(data.get("tags", ())) <= tag_ids:
+                self.reject(number, {"tags": ["Tag does not exist."]})
+            else:
+                checked.append((number, dict(data, owner=owner_id)))
+
+        return checked
+
+    def write(self, rows):
+        pages = Page.objects.bulk_create(
+            [
+                Page(
+                    name=data["name"],
+                    description=data["description"],
+                    owner_id=data["owner"],
+                    image=data.get("image"),
+                    is_private=data["is_private"],
+                )
+                for data in rows
+            ],
+            batch_size=self.batch_size,
+        )
+
+        names = {name for data in rows for name in data.get("tag_names", ())}
+        tag_ids_by_name = {tag.name: tag.id for tag in get_or_create_tags(names)}
+        attach_tags(
+            [
+                (page.pk, tag_id)
+                for page, data in zip(pages, rows)
+                for tag_id in set(data.get("tags", ())) | {tag_ids_by_name[name] for name in data.get("tag_names", ())}
+            ],
+            batch_size=self.batch_size,
+        )
+        search_index.update(Page, *[page.pk for page in pages])
+
+        return len(pages)
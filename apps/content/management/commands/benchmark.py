@@ -0,0 +1,245 @@
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+ID_PATTERN = re.compile(r"/([0-9]+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?=/|$)")
+SERVER_START_TIMEOUT = 30
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+
+    return sorted_values[index]
+
+
+def allowed_host():
+    return next((host for host in settings.ALLOWED_HOSTS if host != "*"), "testserver").lstrip(".")
+
+
+@contextmanager
+def spawned_server():
+    """Base URL of a runserver started on a free local port for the duration of the block"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "django", "runserver", "--noreload", f"127.0.0.1:{port}"],
+        cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True,
+    )
+    try:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            if server.poll() is not None:
+                raise CommandError(f"Server exited on start: {server.stderr.read().decode(errors='replace')}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f"Server did not start within {SERVER_START_TIMEOUT}s")
+                time.sleep(0.1)
+
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        # The whole group, so the server's login hashing workers exit with it
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+
+
+class InProcessTransport:
+    """Sends requests through the Django test client and counts their queries"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.host = allowed_host()
+
+    @property
+    def client(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = Client(SERVER_NAME=self.host)
+        return self.local.client
+
+    def send(self, method, path, body, headers):
+        extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.generic(
+                method, path, json.dumps(body) if body is not None else "",
+                content_type="application/json", **extra
+            )
+
+        return response.status_code, response.content, len(queries)
+
+
+class HttpTransport:
+    """Sends requests to a running server, queries cannot be counted from here"""
+
+    def __init__(self, base_url, host=None):
+        self.base_url = base_url.rstrip("/")
+        self.host = host
+
+    def send(self, method, path, body, headers):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json", **headers}
+        if self.host:
+            headers["Host"] = self.host
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), None
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a JSONL corpus of API requests and report latency percentiles, throughput "
+        "and queries per request for every endpoint. Each line is an object with "
+        "\"method\", \"path\" and optional \"body\", \"name\" and \"auth\" "
+        "({\"email\": ..., \"password\": ...}) keys. The example corpus in benchmarks/corpus.jsonl "
+        "logs in as bench@example.com with password bench-password. "
+        "Requests go through the in-process test client unless --server or --spawn is given, "
+        "as only the test client can count queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("corpus", help="Path to the JSONL corpus")
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument("--server", help="Base URL of a running server")
+        target.add_argument(
+            "--spawn", action="store_true",
+            help="Start runserver with the current settings on a free local port and replay against it",
+        )
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        corpus = self.load_corpus(options["corpus"]) * options["repeat"]
+
+        if options["spawn"]:
+            with spawned_server() as base_url:
+                options["server"] = base_url
+                report = self.replay(corpus, HttpTransport(base_url, host=allowed_host()), options)
+        elif options["server"]:
+            report = self.replay(corpus, HttpTransport(options["server"]), options)
+        else:
+            report = self.replay(corpus, InProcessTransport(), options)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def replay(self, corpus, transport, options):
+        self.transport = transport
+        self.tokens = {}
+        self.tokens_lock = threading.Lock()
+
+        started = time.perf_counter()
+        if options["concurrency"] > 1:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                samples = list(executor.map(self.run_one, corpus))
+        else:
+            samples = [self.run_one(entry) for entry in corpus]
+        duration = time.perf_counter() - started
+
+        return self.build_report(samples, duration, options)
+
+    def load_corpus(self, path):
+        corpus = []
+        try:
+            with open(path) as corpus_file:
+                for number, line in enumerate(corpus_file, start=1):
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if "path" not in entry:
+                        raise CommandError(f"Line {number} of {path} has no path")
+                    corpus.append(entry)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read corpus: {e}")
+
+        return corpus
+
+    def run_one(self, entry):
+        headers = {}
+        if entry.get("auth"):
+            headers["Authorization"] = "Token " + self.get_token(entry["auth"])
+
+        started = time.perf_counter()
+        status, _, queries = self.transport.send(
+            entry.get("method", "GET").upper(), entry["path"], entry.get("body"), headers
+        )
+        latency = time.perf_counter() - started
+
+        return {
+            "endpoint": entry.get("name") or ID_PATTERN.sub("/{id}", entry["path"]),
+            "status": status,
+            "latency": latency,
+            "queries": queries,
+        }
+
+    def get_token(self, credentials):
+        key = (credentials["email"], credentials["password"])
+        with self.tokens_lock:
+            if key not in self.tokens:
+                status, content, _ = self.transport.send("POST", "/login/", credentials, {})
+                if status >= 400:
+                    raise CommandError(f"Cannot log in as {credentials['email']}: {status}")
+                self.tokens[key] = json.loads(content)["access"]
+
+        return self.tokens[key]
+
+    def build_report(self, samples, duration, options):
+        by_endpoint = defaultdict(list)
+        for sample in samples:
+            by_endpoint[sample["endpoint"]].append(sample)
+
+        endpoints = {}
+        for endpoint, endpoint_samples in sorted(by_endpoint.items()):
+            latencies = sorted(sample["latency"] * 1000 for sample in endpoint_samples)
+            queries = [sample["queries"] for sample in endpoint_samples if sample["queries"] is not None]
+            endpoints[endpoint] = {
+                "requests": len(endpoint_samples),
+                "errors": sum(1 for sample in endpoint_samples if sample["status"] >= 400),
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+                "mean_ms": sum(latencies) / len(latencies),
+                "throughput_rps": len(endpoint_samples) / duration if duration else None,
+                "queries_per_request": sum(queries) / len(queries) if queries else None,
+            }
+
+        return {
+            "target": options["server"] or "test-client",
+            "concurrency": options["concurrency"],
+            "requests": len(samples),
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "duration_s": duration,
+            "throughput_rps": len(samples) / duration if duration else None,
+            "endpoints": endpoints,
+        }
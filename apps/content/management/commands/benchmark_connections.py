@@ -0,0 +1,52 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from apps.content.management.commands.benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database latency when every request opens its own connection "
+        "versus reusing a persistent one (CONN_MAX_AGE)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        configured_max_age = connection.settings_dict["CONN_MAX_AGE"]
+
+        report = {}
+        try:
+            for mode, max_age in (("per_request", 0), ("persistent", configured_max_age or 60)):
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                latencies = sorted(self.request_cycle(connection) * 1000 for _ in range(options["requests"]))
+                report[mode] = {
+                    "conn_max_age": max_age,
+                    "p50_ms": percentile(latencies, 0.50),
+                    "p95_ms": percentile(latencies, 0.95),
+                    "mean_ms": sum(latencies) / len(latencies),
+                }
+        finally:
+            connection.close()
+            connection.settings_dict["CONN_MAX_AGE"] = configured_max_age
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def request_cycle(self, connection):
+        """One request worth of connection handling around a trivial query"""
+        started = time.perf_counter()
+        request_started.send(sender=self.__class__)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        request_finished.send(sender=self.__class__)
+
+        return time.perf_counter() - started
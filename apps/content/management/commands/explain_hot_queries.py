@@ -0,0 +1,81 @@
+import re
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from apps.content.models import Page, Post
+from apps.content.timelines import followed_page_ids
+
+User = get_user_model()
+
+SEQUENTIAL_SCAN = re.compile(r"Seq Scan on (\w+)|\bSCAN (?:TABLE )?(\w+)(?!\w| USING)")
+
+
+def hot_queries():
+    """The queries behind the feed, follow and moderation paths, bound to sample ids"""
+    user_id = User.objects.values_list("id", flat=True).first() or 0
+    page_id = Page.objects.values_list("id", flat=True).first() or uuid.uuid4()
+    post_id = Post.objects.values_list("id", flat=True).first() or 0
+    followed_pages = followed_page_ids(user_id)
+
+    return {
+        "followed-pages-posts": Post.objects.filter(page_id__in=followed_pages).order_by("-created_at", "-id")[:11],
+        "page-posts": Post.objects.filter(page_id=page_id).order_by("-created_at", "-id")[:11],
+        "post-replies": Post.objects.filter(reply_to_id=post_id).order_by("created_at")[:100],
+        "page-followers": User.objects.filter(follows=page_id).only("id", "username")[:10],
+        "page-follow-requests": User.objects.filter(requests=page_id).only("id", "username")[:10],
+        "blocked-users": User.objects.filter(is_blocked=True).values("id"),
+        "pages-due-unblock": Page.objects.filter(unblock_date__lte=timezone.now()).values("id"),
+        "private-pages-of-owner": Page.objects.filter(owner_id=user_id, is_private=True).values("id"),
+    }
+
+
+def sequential_scans(plan, tables):
+    return sorted({
+        name for match in SEQUENTIAL_SCAN.finditer(plan)
+        for name in match.groups() if name in tables
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the SQL of the hot endpoints and flag sequential scans. Planners "
+        "prefer scans on tiny tables, so run it against production-sized data or with "
+        "--no-seqscan (Postgres only) to check that an index can serve every query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--no-seqscan", action="store_true", help="Discourage sequential scans in the planner")
+        parser.add_argument("--fail-on-seqscan", action="store_true", help="Exit with an error if any query scans")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if options["no_seqscan"] and connection.vendor != "postgresql":
+            raise CommandError("--no-seqscan is only supported on PostgreSQL")
+
+        tables = set(connection.introspection.table_names())
+        flagged = {}
+
+        with transaction.atomic(using=options["database"]):
+            if options["no_seqscan"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, queryset in hot_queries().items():
+                plan = queryset.using(options["database"]).explain()
+                scans = sequential_scans(plan, tables)
+
+                if scans:
+                    flagged[name] = scans
+                    self.stdout.write(self.style.WARNING(f"{name}: sequential scan on {', '.join(scans)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+                if options["verbosity"] > 1:
+                    self.stdout.write(plan)
+
+        if flagged and options["fail_on_seqscan"]:
+            raise CommandError(f"Sequential scans in {', '.join(sorted(flagged))}")
@@ -0,0 +1,46 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.content.imports import PageImporter, PostImporter, iter_records
+from innotter.settings import IMPORT_BATCH_SIZE
+
+IMPORTERS = {
+    "posts": PostImporter,
+    "pages": PageImporter,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import posts or pages from a JSON array or NDJSON file, streamed and written in "
+        "batches. Posts are objects with \"page\", \"content\" and optional \"reply_to\"; "
+        "pages have \"name\", \"description\", \"owner\" and optional \"image\", "
+        "\"is_private\", \"tags\" (ids) and \"tag_names\"."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="File to import, - reads standard input")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive")
+        importer = IMPORTERS[options["kind"]](options["batch_size"])
+
+        if options["path"] == "-":
+            report = importer.run(iter_records(sys.stdin.buffer))
+        else:
+            try:
+                with open(options["path"], "rb") as source:
+                    report = importer.run(iter_records(source))
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        for error in report["errors"]:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} {options['kind']}, {report['failed']} records failed"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.content.counters import reconcile_page_counters, reconcile_tag_counters
+
+
+class Command(BaseCommand):
+    help = "Recount followers, follow requests and posts of pages and pages of tags whose counters drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = reconcile_page_counters(batch_size=options["batch_size"])
+        fixed_tags = reconcile_tag_counters()
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters of {fixed} pages and {fixed_tags} tags"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.content.sweeper import unblock_sweeper
+
+
+class Command(BaseCommand):
+    help = (
+        "Unblock pages whose unblock date has passed. Runs as a long-lived worker sleeping "
+        "until the next expiry, or sweeps once and exits with --once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Sweep due pages once and exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            unblock_sweeper.run_once()
+        else:
+            try:
+                unblock_sweeper.run(on_sweep=self.write_sweep)
+            except KeyboardInterrupt:
+                pass
+
+        metrics = unblock_sweeper.snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Unblocked {metrics['unblocked']} pages in {metrics['sweeps']} sweeps, "
+            f"max lag {metrics['max_lag_seconds']:.3f}s"
+        ))
+
+    def write_sweep(self, unblocked, metrics):
+        self.stdout.write(
+            f"Swept {unblocked} pages, lag {metrics['last_lag_seconds']:.3f}s; "
+            f"{metrics['unblocked']} pages in {metrics['sweeps']} sweeps so far"
+        )
+        self.stdout.flush()
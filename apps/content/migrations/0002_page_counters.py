@@ -0,0 +1,50 @@
+# Generated by Django 3.2 on 2026-10-18 16:24
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(model):
+    counts = model.objects.filter(page_id=OuterRef("pk")).order_by().values("page_id").annotate(
+        total=Count("*")
+    ).values("total")
+
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_page_counters(apps, schema_editor):
+    Page = apps.get_model("content", "Page")
+    Post = apps.get_model("content", "Post")
+
+    Page.objects.update(
+        followers_count=count_rows(Page.followers.through),
+        follow_requests_count=count_rows(Page.follow_requests.through),
+        posts_count=count_rows(Post),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='follow_requests_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='posts_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_page_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0002_page_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='page',
+            index=models.Index(condition=models.Q(unblock_date__isnull=False), fields=['unblock_date'], name='page_unblock_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='page',
+            index=models.Index(condition=models.Q(is_private=True), fields=['owner'], name='page_private_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['page', '-created_at', '-id'], name='post_page_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['reply_to', 'created_at'], name='post_reply_created_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2 on 2026-10-18 16:45
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+import innotter.db.operations
+from innotter.settings import SEARCH_CONFIG
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    Page = apps.get_model("content", "Page")
+    Post = apps.get_model("content", "Post")
+    Tag = apps.get_model("content", "Tag")
+
+    tag_names = Tag.objects.filter(pages=OuterRef("pk")).order_by().values("pages").annotate(
+        names=StringAgg("name", delimiter=" ")
+    ).values("names")
+    Page.objects.update(search_vector=(
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(tag_names), Value(""), output_field=TextField()),
+                       weight="A", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+    ))
+    Post.objects.update(search_vector=SearchVector("content", weight="A", config=SEARCH_CONFIG))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        innotter.db.operations.AddPostgresIndex(
+            model_name='page',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='page_search_idx'),
+        ),
+        innotter.db.operations.AddPostgresIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='post_search_idx'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-18 16:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_tag_counters(apps, schema_editor):
+    Tag = apps.get_model("content", "Tag")
+    Page = apps.get_model("content", "Page")
+
+    counts = Page.tags.through.objects.filter(tag_id=OuterRef("pk")).order_by().values("tag_id").annotate(
+        total=Count("*")
+    ).values("total")
+    Tag.objects.update(pages_count=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0004_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='pages_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-pages_count', 'id'], name='tag_pages_count_idx'),
+        ),
+        migrations.RunPython(fill_tag_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0005_tag_pages_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='is_blocked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
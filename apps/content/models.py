@@ -1,10 +1,19 @@
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Q
 
 
 class Tag(models.Model):
     name = models.CharField(max_length=30, unique=True)
+    pages_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-pages_count", "id"], name="tag_pages_count_idx"),
+        ]
 
 
 class Page(models.Model):
@@ -22,7 +31,20 @@ class Page(models.Model):
     is_private = models.BooleanField(default=False)
     follow_requests = models.ManyToManyField('authentication.User',
                                              related_name='requests')
+    is_blocked = models.BooleanField(default=False)
     unblock_date = models.DateTimeField(null=True, blank=True)
+    followers_count = models.IntegerField(default=0, editable=False)
+    follow_requests_count = models.IntegerField(default=0, editable=False)
+    posts_count = models.IntegerField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="page_search_idx"),
+            models.Index(fields=["unblock_date"], condition=Q(unblock_date__isnull=False),
+                         name="page_unblock_date_idx"),
+            models.Index(fields=["owner"], condition=Q(is_private=True), name="page_private_owner_idx"),
+        ]
 
 
 class Post(models.Model):
@@ -33,3 +55,11 @@ class Post(models.Model):
                                  null=True, related_name='replies')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="post_search_idx"),
+            models.Index(fields=["page", "-created_at", "-id"], name="post_page_created_idx"),
+            models.Index(fields=["reply_to", "created_at"], name="post_reply_created_idx"),
+        ]
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.authentication.cache import principal_cache
+from apps.content.models import Page
+from apps.content.sweeper import unblock_sweeper
+from apps.content.timelines import timeline_store
+
+User = get_user_model()
+
+
+def moderate(user_ids=(), page_ids=(), blocked=True, unblock_date=None):
+    """
+    Block or unblock users and pages with one UPDATE per model, then forget
+    the cached users and feeds they affect. Pages blocked without an
+    ``unblock_date`` stay blocked until unblocked by hand.
+    """
+    user_ids, page_ids = set(user_ids), set(page_ids)
+
+    with transaction.atomic():
+        users = User.objects.filter(pk__in=user_ids).update(is_blocked=blocked) if user_ids else 0
+        pages = Page.objects.filter(pk__in=page_ids).update(
+            is_blocked=blocked, unblock_date=unblock_date if blocked else None
+        ) if page_ids else 0
+
+    if user_ids:
+        principal_cache.invalidate(*user_ids)
+        timeline_store.invalidate(*user_ids)
+    timeline_store.drop_pages(*page_ids)
+    if pages and blocked and unblock_date is not None:
+        unblock_sweeper.schedule(unblock_date)
+
+    return {"users": users, "pages": pages}
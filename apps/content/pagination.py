@@ -0,0 +1,123 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def older_than(queryset, position):
+    """Rows strictly after ``position`` in newest-first (created_at, id) order"""
+    created_at, pk = position
+
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+        created_at__lte=created_at,
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first cursor pagination on (created_at, id). The cursor carries
+    the position of the last row of the previous page, so every page is an
+    index range scan no matter how deep the client scrolls.
+    """
+
+    page_size = 10
+    max_page_size = 100
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        limit = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        if position is not None:
+            queryset = older_than(queryset, position)
+
+        results = list(queryset.order_by("-created_at", "-id")[:limit + 1])
+        has_next = len(results) > limit
+        results = results[:limit]
+
+        self.next_position = None
+        if has_next:
+            self.next_position = (results[-1].created_at, results[-1].id)
+
+        return results
+
+    def paginate_positions(self, queryset, request, positions):
+        """
+        Page of the rows at ``positions``, (created_at, id) pairs read ahead
+        from an index kept outside the table. The next cursor follows the
+        positions rather than the rows found, so rows filtered out of
+        ``queryset`` shorten a page without ending the listing.
+        """
+        self.request = request
+        limit = self.get_page_size(request)
+        page = positions[:limit]
+
+        self.next_position = page[-1] if len(positions) > limit else None
+
+        return list(queryset.filter(id__in=[pk for created_at, pk in page]).order_by("-created_at", "-id"))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            limit = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if limit <= 0:
+            return self.page_size
+        return min(limit, self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode("ascii")).decode("ascii")
+            created_at, pk = raw.split("|")
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return created_at, pk
+
+    def encode_cursor(self, position):
+        created_at, pk = position
+        raw = f"{created_at.isoformat()}|{pk}"
+
+        return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
@@ -0,0 +1,226 @@
+import re
+import threading
+
+from collections import Counter
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import F, OuterRef, Prefetch, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+from apps.content.models import Page, Post, Tag
+from innotter.settings import SEARCH_CONFIG
+
+TOKEN = re.compile(r"\w+")
+WEIGHTS = {"A": 1.0, "B": 0.4}
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def page_vector():
+    tag_names = Tag.objects.filter(pages=OuterRef("pk")).order_by().values("pages").annotate(
+        names=StringAgg("name", delimiter=" ")
+    ).values("names")
+
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(tag_names), Value(""), output_field=TextField()),
+                       weight="A", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+    )
+
+
+def post_vector():
+    return SearchVector("content", weight="A", config=SEARCH_CONFIG)
+
+
+def page_documents(pages):
+    pages = pages.only("id", "name", "description").prefetch_related(
+        Prefetch("tags", queryset=Tag.objects.only("id", "name"))
+    )
+    for page in pages:
+        tag_names = " ".join(tag.name for tag in page.tags.all())
+        yield page.pk, [(page.name, "A"), (tag_names, "A"), (page.description, "B")]
+
+
+def post_documents(posts):
+    for post in posts.only("id", "content"):
+        yield post.pk, [(post.content, "A")]
+
+
+VECTORS = {Page: page_vector, Post: post_vector}
+DOCUMENTS = {Page: page_documents, Post: post_documents}
+
+
+class RankedResults:
+    """Ranked (pk, rank) hits that load only the rows of the slice being read"""
+
+    def __init__(self, queryset, ranked):
+        self.queryset = queryset
+        self.ranked = ranked
+
+    def count(self):
+        return len(self.ranked)
+
+    def __len__(self):
+        return len(self.ranked)
+
+    def __getitem__(self, index):
+        ranked = self.ranked[index] if isinstance(index, slice) else [self.ranked[index]]
+        objects = self.queryset.in_bulk([pk for pk, rank in ranked])
+
+        results = []
+        for pk, rank in ranked:
+            if pk in objects:
+                objects[pk].rank = rank
+                results.append(objects[pk])
+
+        return results if isinstance(index, slice) else results[0]
+
+
+class InvertedIndex:
+    """
+    In-process term -> {pk: score} postings per model, standing in for the
+    tsvector columns on databases other than PostgreSQL. A model is indexed
+    from the database on its first search and kept current afterwards.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.documents = {}
+
+    def update(self, model, pks):
+        with self.lock:
+            if model not in self.postings:
+                return
+
+        documents = list(DOCUMENTS[model](model.objects.filter(pk__in=pks)))
+        with self.lock:
+            if model not in self.postings:
+                return
+            for pk in pks:
+                self._remove(model, pk)
+            for pk, texts in documents:
+                self._add(model, pk, texts)
+
+    def remove(self, model, pks):
+        with self.lock:
+            if model in self.postings:
+                for pk in pks:
+                    self._remove(model, pk)
+
+    def search(self, model, text):
+        """(pk, rank) of documents holding every term, best first"""
+        self.build(model)
+        terms = set(tokenize(text))
+
+        with self.lock:
+            postings = [self.postings[model].get(term, {}) for term in terms]
+        if not postings:
+            return []
+
+        matches = set.intersection(*(set(scores) for scores in postings))
+        ranked = [(pk, sum(scores[pk] for scores in postings)) for pk in matches]
+
+        return sorted(ranked, key=lambda hit: (-hit[1], str(hit[0])))
+
+    def build(self, model):
+        with self.lock:
+            if model in self.postings:
+                return
+
+        documents = list(DOCUMENTS[model](model.objects.all()))
+        with self.lock:
+            if model in self.postings:
+                return
+            self.postings[model] = {}
+            self.documents[model] = {}
+            for pk, texts in documents:
+                self._add(model, pk, texts)
+
+    def forget(self, model):
+        with self.lock:
+            self.postings.pop(model, None)
+            self.documents.pop(model, None)
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+
+    def _add(self, model, pk, texts):
+        scores = Counter()
+        for text, weight in texts:
+            for term in tokenize(text):
+                scores[term] += WEIGHTS[weight]
+
+        for term, score in scores.items():
+            self.postings[model].setdefault(term, {})[pk] = score
+        self.documents[model][pk] = set(scores)
+
+    def _remove(self, model, pk):
+        for term in self.documents[model].pop(pk, ()):
+            postings = self.postings[model][term]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[model][term]
+
+
+class SearchIndex:
+    """
+    Full-text search over pages (name, tags, description) and posts. On
+    PostgreSQL documents live in GIN-indexed tsvector columns refreshed by
+    ``update``, elsewhere in an ``InvertedIndex``.
+    """
+
+    def __init__(self):
+        self.fallback = InvertedIndex()
+
+    @staticmethod
+    def uses_postgres(model):
+        return connections[router.db_for_write(model)].vendor == "postgresql"
+
+    def update(self, model, *pks):
+        if not pks:
+            return
+
+        if self.uses_postgres(model):
+            model.objects.filter(pk__in=pks).update(search_vector=VECTORS[model]())
+        else:
+            self.fallback.update(model, pks)
+
+    def remove(self, model, *pks):
+        if not self.uses_postgres(model):
+            self.fallback.remove(model, pks)
+
+    def invalidate(self, model):
+        """Rebuild the fallback index of ``model`` on its next search, for rows written without known pks"""
+        if not self.uses_postgres(model):
+            self.fallback.forget(model)
+
+    def search(self, queryset, text):
+        """Rows of ``queryset`` matching ``text`` with a ``rank`` attribute, best first"""
+        if not tokenize(text):
+            return queryset.none()
+
+        model = queryset.model
+        if self.uses_postgres(model):
+            query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+            return queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F("search_vector"), query)
+            ).order_by("-rank", "pk")
+
+        ranked = self.fallback.search(model, text)
+        visible = set(queryset.filter(pk__in=[pk for pk, rank in ranked]).values_list("pk", flat=True))
+
+        return RankedResults(queryset, [hit for hit in ranked if hit[0] in visible])
+
+    def clear(self):
+        self.fallback.clear()
+
+
+search_index = SearchIndex()
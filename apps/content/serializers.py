@@ -1,3 +1,7 @@
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
 from rest_framework import serializers
 
 from apps.content.models import (
@@ -5,6 +9,17 @@ from apps.content.models import (
     Tag,
     Page,
 )
+from apps.content.counters import adjust_page_counters
+from apps.content.moderation import moderate
+from apps.content.tagging import add_page_tags, resolve_tag_ids, set_page_tags
+from apps.content.threads import thread_store
+from apps.content.timelines import timeline_store
+from apps.content.trending import trending_tags
+from innotter.settings import MODERATION_MAX_IDS
+
+User = get_user_model()
+
+REPLY_TO_OTHER_PAGE = "Replies must be posted on the page of the post they reply to."
 
 
 class PostListSerializer(serializers.ModelSerializer):
@@ -32,9 +47,45 @@ class PostCreateSerializer(serializers.ModelSerializer):
         fields = (
             "content",
             "page",
+            "reply_to",
+        )
+
+    def validate(self, data):
+        reply_to = data.get("reply_to")
+        if reply_to is not None and reply_to.page_id != data["page"].pk:
+            raise serializers.ValidationError({"reply_to": [REPLY_TO_OTHER_PAGE]})
+
+        return data
+
+    def create(self, validated_data):
+        new_post = super().create(validated_data)
+        adjust_page_counters(new_post.page_id, posts_count=1)
+        timeline_store.push(new_post)
+        if new_post.reply_to_id is not None:
+            thread_store.invalidate(new_post.reply_to_id)
+
+        return new_post
+
+
+class PostSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Post
+        fields = (
+            "id",
+            "page",
+            "content",
+            "rank",
         )
 
 
+class PostImportSerializer(serializers.Serializer):
+    page = serializers.UUIDField()
+    content = serializers.CharField(max_length=180)
+    reply_to = serializers.IntegerField(required=False, allow_null=True)
+
+
 class PostUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
@@ -58,6 +109,16 @@ class TagListAndRetrieveSerializer(serializers.ModelSerializer):
         )
 
 
+class TagTrendingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = (
+            "id",
+            "name",
+            "pages_count",
+        )
+
+
 class TagUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -68,6 +129,7 @@ class TagUpdateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         instance.name = validated_data["name"]
         instance.save()
+        trending_tags.update({instance.id})
 
         return instance
 
@@ -92,6 +154,9 @@ class PageListSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "owner",
+            "followers_count",
+            "follow_requests_count",
+            "posts_count",
         )
 
 
@@ -105,12 +170,58 @@ class PageRetrieveSerializer(serializers.ModelSerializer):
             "description",
             "owner",
             "tags",
-            "followers",
-            "follow_requests",
+            "followers_count",
+            "follow_requests_count",
+            "posts_count",
+        )
+
+
+class PageSearchSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Page
+        fields = (
+            "id",
+            "name",
+            "owner",
+            "followers_count",
+            "rank",
+        )
+
+
+class PageFollowerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = (
+            "id",
+            "username",
         )
 
 
+class TagIdsField(serializers.ListField):
+    """Tag primary keys, all checked for existence with one query"""
+
+    child = serializers.IntegerField()
+
+    def to_internal_value(self, data):
+        tag_ids = set(super().to_internal_value(data))
+        missing = tag_ids - set(Tag.objects.filter(id__in=tag_ids).values_list("id", flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Invalid pk "{min(missing)}" - object does not exist.')
+
+        return tag_ids
+
+    def to_representation(self, value):
+        return [tag.pk for tag in value.all()]
+
+
 class PageCreateSerializer(serializers.ModelSerializer):
+    tags = TagIdsField(required=False)
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=30), required=False, write_only=True
+    )
+
     class Meta:
         model = Page
         fields = (
@@ -118,6 +229,7 @@ class PageCreateSerializer(serializers.ModelSerializer):
             "owner",
             "description",
             "tags",
+            "tag_names",
         )
         extra_kwargs = {
             "name": {"required": True},
@@ -125,20 +237,25 @@ class PageCreateSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        new_page = Page.objects.create(
-            name=validated_data["name"],
-            owner=validated_data["owner"],
-            description=validated_data["description"],
-        )
-        for single_tag in validated_data["tags"]:
-            new_page.tags.add(single_tag)
-
-        new_page.save()
+        with transaction.atomic():
+            new_page = Page.objects.create(
+                name=validated_data["name"],
+                owner=validated_data["owner"],
+                description=validated_data["description"],
+            )
+            add_page_tags(new_page, resolve_tag_ids(
+                validated_data.get("tags", ()), validated_data.get("tag_names", ())
+            ))
 
         return new_page
 
 
 class PageUpdateSerializer(serializers.ModelSerializer):
+    tags = TagIdsField(required=False)
+    tag_names = serializers.ListField(
+        child=serializers.CharField(max_length=30), required=False, write_only=True
+    )
+
     class Meta:
         model = Page
         fields = (
@@ -146,16 +263,94 @@ class PageUpdateSerializer(serializers.ModelSerializer):
             "owner",
             "description",
             "tags",
+            "tag_names",
         )
 
-        def update(self, validated_data, instance):
-            instance.name = validated_data["name"]
-            instance.owner = validated_data["owner"]
-            instance.description = validated_data["description"]
+    def update(self, instance, validated_data):
+        fields = [field for field in ("name", "owner", "description") if field in validated_data]
+        for field in fields:
+            setattr(instance, field, validated_data[field])
+
+        with transaction.atomic():
+            if fields:
+                instance.save(update_fields=fields)
+            if "tags" in validated_data or "tag_names" in validated_data:
+                set_page_tags(instance, resolve_tag_ids(
+                    validated_data.get("tags", ()), validated_data.get("tag_names", ())
+                ))
+
+        return instance
+
+
+class PageImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=80)
+    description = serializers.CharField(allow_blank=True)
+    owner = serializers.IntegerField(required=False)
+    image = serializers.URLField(required=False, allow_null=True)
+    is_private = serializers.BooleanField(default=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+    tag_names = serializers.ListField(child=serializers.CharField(max_length=30), required=False)
+
 
-            for single_tag in validated_data["tags"]:
-                instance.tags.add(single_tag)
+class AcceptFollowSerializer(serializers.Serializer):
+    unfollowed_users = serializers.ListField(child=serializers.IntegerField(), required=False)
+    accept_all = serializers.BooleanField(default=False)
 
-            instance.save()
+    def validate(self, validated_data):
+        if not validated_data["accept_all"] and not validated_data.get("unfollowed_users"):
+            raise serializers.ValidationError(
+                {"unfollowed_users": "Provide users to accept or set accept_all."}
+            )
+        return validated_data
 
-            return instance
+    def create(self, validated_data):
+        """Moving pending follow requests of the page to its followers"""
+        page = self.context["page"]
+        follow_requests = Page.follow_requests.through.objects.filter(page_id=page.id)
+        if not validated_data["accept_all"]:
+            follow_requests = follow_requests.filter(user_id__in=validated_data["unfollowed_users"])
+
+        with transaction.atomic():
+            user_ids = list(follow_requests.select_for_update().values_list("user_id", flat=True))
+            already_following = set(
+                Page.followers.through.objects.filter(page_id=page.id, user_id__in=user_ids)
+                .values_list("user_id", flat=True)
+            )
+            new_followers = [user_id for user_id in user_ids if user_id not in already_following]
+            Page.followers.through.objects.bulk_create(
+                [Page.followers.through(page_id=page.id, user_id=user_id) for user_id in new_followers],
+                ignore_conflicts=True,
+            )
+            deleted, _ = follow_requests.filter(user_id__in=user_ids).delete()
+            adjust_page_counters(
+                page.id,
+                followers_count=len(new_followers),
+                follow_requests_count=-deleted,
+            )
+
+        timeline_store.invalidate(*user_ids)
+
+        return {"accepted": user_ids}
+
+
+class ModerationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=("block", "unblock"))
+    users = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MODERATION_MAX_IDS)
+    pages = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=MODERATION_MAX_IDS)
+    unblock_date = serializers.DateTimeField(required=False, allow_null=True)
+
+    def validate(self, validated_data):
+        if not validated_data.get("users") and not validated_data.get("pages"):
+            raise serializers.ValidationError({"users": "Provide users or pages to moderate."})
+        unblock_date = validated_data.get("unblock_date")
+        if unblock_date is not None and unblock_date <= timezone.now():
+            raise serializers.ValidationError({"unblock_date": "Unblock date must be in the future."})
+        return validated_data
+
+    def create(self, validated_data):
+        return moderate(
+            user_ids=validated_data.get("users", ()),
+            page_ids=validated_data.get("pages", ()),
+            blocked=validated_data["action"] == "block",
+            unblock_date=validated_data.get("unblock_date"),
+        )
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.content.models import Page, Post, Tag
+from apps.content.search import search_index
+
+SEARCHED_FIELDS = {Page: {"name", "description"}, Post: {"content"}}
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_save, sender=Post)
+def refresh_search_document(sender, instance, update_fields=None, **kwargs):
+    """Saves that leave every searched field alone, like making a page private, keep their document"""
+    if update_fields is None or SEARCHED_FIELDS[sender] & set(update_fields):
+        search_index.update(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Page)
+@receiver(post_delete, sender=Post)
+def remove_search_document(sender, instance, **kwargs):
+    search_index.remove(sender, instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def refresh_tagged_pages(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or "name" in update_fields):
+        search_index.update(Page, *instance.pages.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_pages(sender, instance, **kwargs):
+    instance.tagged_page_ids = list(instance.pages.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def refresh_untagged_pages(sender, instance, **kwargs):
+    search_index.update(Page, *getattr(instance, "tagged_page_ids", ()))
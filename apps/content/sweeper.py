@@ -0,0 +1,150 @@
+import heapq
+import logging
+import threading
+
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.content.models import Page
+from apps.content.timelines import timeline_store
+from innotter.settings import UNBLOCK_SWEEP_BATCH_SIZE, UNBLOCK_SWEEP_MAX_SLEEP
+
+logger = logging.getLogger(__name__)
+
+
+class UnblockSweeper:
+    """
+    Unblocks pages whose unblock_date has passed. Upcoming due times are
+    kept in a min-heap loaded from the unblock_date index, so the sweeper
+    sleeps until the next expiry instead of polling the table. The heap is
+    reloaded at least every ``max_sleep`` seconds to pick up pages blocked
+    by other processes; ``schedule`` wakes it early within this process.
+    Metrics are updated under the lock, ``snapshot`` reads them while the
+    sweeper runs and every sweep is logged with the running totals.
+    """
+
+    def __init__(self, batch_size, max_sleep):
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.heap = []
+        self.reload_at = None
+        self.thread = None
+        self.metrics = {
+            "sweeps": 0,
+            "unblocked": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+    def schedule(self, unblock_date):
+        with self.lock:
+            if self.thread is None:
+                return
+            heapq.heappush(self.heap, unblock_date)
+            if self.heap[0] == unblock_date:
+                self.wakeup.set()
+
+    def reload(self, now):
+        due_dates = list(
+            Page.objects.filter(is_blocked=True, unblock_date__isnull=False)
+            .order_by("unblock_date")
+            .values_list("unblock_date", flat=True)[:self.batch_size]
+        )
+        with self.lock:
+            self.heap = due_dates
+            heapq.heapify(self.heap)
+            self.reload_at = now + timedelta(seconds=self.max_sleep)
+
+    def sweep(self, now):
+        """Unblock every page due at ``now`` in batches, returning how many were unblocked"""
+        unblocked = 0
+        while True:
+            with transaction.atomic():
+                due = list(
+                    Page.objects.filter(is_blocked=True, unblock_date__lte=now)
+                    .order_by("unblock_date")
+                    .select_for_update(skip_locked=True)
+                    .values_list("id", "unblock_date")[:self.batch_size]
+                )
+                if not due:
+                    break
+                page_ids = [page_id for page_id, unblock_date in due]
+                Page.objects.filter(pk__in=page_ids).update(is_blocked=False, unblock_date=None)
+
+            timeline_store.drop_pages(*page_ids)
+            unblocked += len(page_ids)
+            self.record_lag((now - due[0][1]).total_seconds())
+
+        with self.lock:
+            self.metrics["sweeps"] += 1
+            self.metrics["unblocked"] += unblocked
+
+        return unblocked
+
+    def record_lag(self, lag):
+        with self.lock:
+            self.metrics["last_lag_seconds"] = lag
+            self.metrics["max_lag_seconds"] = max(self.metrics["max_lag_seconds"], lag)
+
+    def snapshot(self):
+        """Copy of the metrics, consistent across fields while the sweeper runs"""
+        with self.lock:
+            return dict(self.metrics)
+
+    def report(self, unblocked, on_sweep=None):
+        metrics = self.snapshot()
+        logger.info(
+            "Unblocked %d pages, lag %.3fs; %d pages in %d sweeps, max lag %.3fs",
+            unblocked, metrics["last_lag_seconds"], metrics["unblocked"], metrics["sweeps"],
+            metrics["max_lag_seconds"],
+        )
+        if on_sweep is not None:
+            on_sweep(unblocked, metrics)
+
+    def run_once(self, on_sweep=None):
+        """
+        Sweep if anything is due and return the seconds until the next expiry
+        or reload. ``on_sweep(unblocked, metrics)`` is called after a sweep.
+        """
+        now = timezone.now()
+        with self.lock:
+            due = self.reload_at is None or now >= self.reload_at or bool(self.heap and self.heap[0] <= now)
+            while self.heap and self.heap[0] <= now:
+                heapq.heappop(self.heap)
+
+        if due:
+            self.report(self.sweep(now), on_sweep)
+        if self.reload_at is None or now >= self.reload_at:
+            self.reload(now)
+
+        with self.lock:
+            next_at = min(self.heap[0], self.reload_at) if self.heap else self.reload_at
+
+        return max(0.0, (next_at - timezone.now()).total_seconds())
+
+    def run(self, on_sweep=None):
+        while True:
+            self.wakeup.clear()
+            try:
+                timeout = self.run_once(on_sweep)
+            except Exception:
+                logger.exception("Unblock sweep failed")
+                timeout = self.max_sleep
+            finally:
+                close_old_connections()
+
+            self.wakeup.wait(timeout)
+
+    def start(self):
+        """Run the sweeper on a daemon thread of this process, once"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="unblock-sweeper", daemon=True)
+                self.thread.start()
+
+
+unblock_sweeper = UnblockSweeper(batch_size=UNBLOCK_SWEEP_BATCH_SIZE, max_sleep=UNBLOCK_SWEEP_MAX_SLEEP)
@@ -0,0 +1,74 @@
+from collections import Counter
+
+from apps.content.counters import adjust_tag_counters
+from apps.content.models import Page, Tag
+from apps.content.search import search_index
+from apps.content.trending import trending_tags
+
+
+def record_tag_changes(added=(), removed=()):
+    """
+    Keep tag page counts and the trending list in step with attached
+    (``added``) and detached (``removed``) tag ids, one entry per page.
+    """
+    deltas = Counter(added)
+    deltas.subtract(removed)
+
+    adjust_tag_counters(deltas)
+    trending_tags.update(set(deltas))
+
+
+def get_or_create_tags(names):
+    """Tags with the given names, the missing ones created with one bulk insert"""
+    names = set(names)
+    if not names:
+        return []
+
+    tags = list(Tag.objects.filter(name__in=names))
+    missing = names - {tag.name for tag in tags}
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tags.extend(Tag.objects.filter(name__in=missing))
+
+    return tags
+
+
+def resolve_tag_ids(tag_ids=(), names=()):
+    return set(tag_ids) | {tag.id for tag in get_or_create_tags(names)}
+
+
+def attach_tags(page_tag_ids, batch_size=None):
+    """Insert new (page_id, tag_id) through rows in bulk and count them in on their tags"""
+    page_tag_ids = set(page_tag_ids)
+    Page.tags.through.objects.bulk_create(
+        [Page.tags.through(page_id=page_id, tag_id=tag_id) for page_id, tag_id in page_tag_ids],
+        ignore_conflicts=True,
+        batch_size=batch_size,
+    )
+    record_tag_changes(added=[tag_id for page_id, tag_id in page_tag_ids])
+
+
+def add_page_tags(page, tag_ids):
+    """Attach tags to a page that has none yet with a single through-table insert"""
+    if tag_ids:
+        attach_tags((page.pk, tag_id) for tag_id in tag_ids)
+        search_index.update(Page, page.pk)
+
+
+def set_page_tags(page, tag_ids):
+    """Replace the tags of ``page``, writing only the through rows that changed"""
+    through = Page.tags.through
+    current = set(through.objects.filter(page_id=page.pk).values_list("tag_id", flat=True))
+    added = set(tag_ids) - current
+    removed = current - set(tag_ids)
+
+    if removed:
+        through.objects.filter(page_id=page.pk, tag_id__in=removed).delete()
+    if added:
+        through.objects.bulk_create(
+            [through(page_id=page.pk, tag_id=tag_id) for tag_id in added],
+            ignore_conflicts=True,
+        )
+    record_tag_changes(added=added, removed=removed)
+    if added or removed:
+        search_index.update(Page, page.pk)
@@ -1,12 +1,39 @@
+import io
+import json
+import logging
+import threading
+
+from datetime import timedelta
+from pathlib import Path
+
 import pytest
 
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test.utils import CaptureQueriesContext
+
+from asgiref.sync import async_to_sync
 from django.urls import reverse
+from django.core.management import call_command
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
+from apps.authentication.backends import AuthContext
 from apps.authentication.fixtures import auto_login_user
-from apps.content.fixtures import page_fixture
-from apps.content.models import Tag, Page
+from apps.content import async_views, timelines
+from apps.content.counters import adjust_page_counters
+from apps.content.exports import export_response
+from apps.content.fixtures import page_fixture, seeded_page_fixture
+from apps.content.management.commands.explain_hot_queries import sequential_scans
+from apps.content.models import Tag, Page, Post
+from apps.content.search import search_index
+from apps.content.sweeper import UnblockSweeper
+from apps.content.timelines import timeline_store
+from apps.content.trending import trending_tags
+from innotter import caches as innotter_caches
+from innotter.db.pool import ConnectionPool
+from innotter.db.replicas import is_pinned_to_primary
 
 User = get_user_model()
 
@@ -32,6 +59,25 @@ def test_page_retrieve_view(client, auto_login_user, page_fixture):
     assert response.status_code == 200
     assert response.data["id"] == str(page.id)
     assert response.data["name"] == page.name
+    assert response.data["followers_count"] == 1
+    assert response.data["follow_requests_count"] == 1
+    assert response.data["posts_count"] == 0
+
+
+@pytest.mark.django_db
+def test_page_followers_and_follow_requests_views(client, auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+
+    followers_url = reverse("content:pages-followers", kwargs={"pk": str(page.id)})
+    followers = client.get(followers_url, HTTP_AUTHORIZATION='Token ' + access_token)
+    requests_url = reverse("content:pages-follow-requests", kwargs={"pk": str(page.id)})
+    follow_requests = client.get(requests_url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert followers.status_code == 200
+    assert followers.data["count"] == 1
+    assert followers.data["results"][0]["username"] == "follower_for_test_page"
+    assert follow_requests.data["results"][0]["username"] == "follow_request_user_for_test_page"
 
 
 @pytest.mark.django_db
@@ -122,4 +168,1061 @@ def test_page_follow_view(client, auto_login_user, page_fixture):
     url = reverse("content:pages-follow", kwargs={"uuid": str(page.id)})
     response = client.get(url, HTTP_AUTHORIZATION='Token ' + response_from_login.data["access"])
     assert user in Page.objects.get(id=page.id).follow_requests.all()
+    assert Page.objects.get(id=page.id).follow_requests_count == 2
+
+
+@pytest.mark.django_db
+def test_followed_pages_posts_view(client, auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    posts = [Post.objects.create(page=page, content=f"post {i}") for i in range(15)]
+    Post.objects.create(
+        page=Page.objects.create(name="not followed", description="", owner=user),
+        content="hidden",
+    )
+
+    url = reverse("content:posts-followed-pages-posts")
+    first = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+    second = client.get(first.data["next"], HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert first.status_code == 200
+    assert [post["id"] for post in first.data["results"] + second.data["results"]] == \
+        [post.id for post in reversed(posts)]
+    assert second.data["next"] is None
+
+
+@pytest.mark.django_db
+def test_followed_pages_posts_from_timeline(client, auto_login_user, page_fixture, monkeypatch):
+    monkeypatch.setattr(timeline_store, "enabled", True)
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    old_post = Post.objects.create(page=page, content="old post")
+
+    url = reverse("content:posts-followed-pages-posts")
+    client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+    client.post(
+        reverse("content:posts-list"),
+        data={"content": "new post", "page": str(page.id)},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    response = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    new_post = Post.objects.get(content="new post")
+    assert [post["id"] for post in response.data["results"]] == [new_post.id, old_post.id]
+    assert timeline_store.shared.get(timeline_store._key(user.id))["entries"][0][1] == new_post.id
+
+
+@pytest.mark.django_db
+def test_timeline_feed_pages_past_deleted_and_blocked_posts(client, auto_login_user, page_fixture, monkeypatch):
+    monkeypatch.setattr(timeline_store, "enabled", True)
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    blocked_page = Page.objects.create(name="blocked", description="", owner=user)
+    blocked_page.followers.add(user)
+    posts = [Post.objects.create(page=page, content=f"post {i}") for i in range(15)]
+    blocked_post = Post.objects.create(page=blocked_page, content="blocked post")
+    url = reverse("content:posts-followed-pages-posts")
+    client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    response = client.delete(
+        reverse("content:posts-detail", kwargs={"pk": posts[-1].id}), HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert response.status_code == 202
+    entries = timeline_store.shared.get(timeline_store._key(user.id))["entries"]
+    assert posts[-1].id not in [pk for created_at, pk in entries]
+
+    # Blocked without invalidating the timeline, as a page blocked by another process would be
+    Page.objects.filter(pk=blocked_page.pk).update(is_blocked=True)
+    seen = []
+    next_url = url
+    while next_url:
+        response = client.get(next_url, HTTP_AUTHORIZATION='Token ' + access_token)
+        seen.extend(post["id"] for post in response.data["results"])
+        next_url = response.data["next"]
+
+    assert blocked_post.id not in seen
+    assert seen == [post.id for post in reversed(posts[:-1])]
+
+
+@pytest.mark.django_db
+def test_timeline_rebuild_waits_for_lock(auto_login_user, page_fixture, monkeypatch):
+    monkeypatch.setattr(timeline_store, "enabled", True)
+    monkeypatch.setattr(timelines, "PUSH_LOCK_ATTEMPTS", 1)
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    post = Post.objects.create(page=page, content="post")
+
+    timeline_store.shared.add(timeline_store.lock_key, True)
+    assert timeline_store.read(user.id, None, 10) == [(post.created_at, post.id)]
+    assert timeline_store.shared.get(timeline_store._key(user.id)) is None
+
+
+@pytest.mark.django_db
+def test_timeline_follows_pages_across_fanout_threshold(client, auto_login_user, page_fixture, monkeypatch):
+    monkeypatch.setattr(timeline_store, "enabled", True)
+    monkeypatch.setattr(timeline_store, "max_fanout", 2)
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    Page.objects.filter(pk=page.pk).update(followers_count=2)
+    old_post = Post.objects.create(page=page, content="old post")
+    url = reverse("content:posts-followed-pages-posts")
+
+    def feed():
+        return [post["id"] for post in client.get(url, HTTP_AUTHORIZATION='Token ' + access_token).data["results"]]
+
+    assert feed() == [old_post.id]
+
+    # Too big to fan out: new posts are pulled instead of pushed
+    page.followers.add(User.objects.create_user(username="third", email="third@gmail.com", role="user"))
+    Page.objects.filter(pk=page.pk).update(followers_count=3)
+    big_post = Post.objects.create(page=page, content="big post")
+    assert feed() == [big_post.id, old_post.id]
+
+    # Small again: posts are pushed, and the pulled ones are kept
+    Page.objects.filter(pk=page.pk).update(followers_count=2)
+    page.followers.remove(User.objects.get(username="third"))
+    small_post = Post.objects.create(page=page, content="small post")
+    timeline_store.push(small_post)
+    assert feed() == [small_post.id, big_post.id, old_post.id]
+    assert timeline_store.shared.get(timeline_store._key(user.id))["pull_pages"] == []
+
+
+@pytest.mark.django_db
+def test_timeline_push_waits_for_lock(auto_login_user, page_fixture, monkeypatch):
+    monkeypatch.setattr(timeline_store, "enabled", True)
+    monkeypatch.setattr(timelines, "PUSH_LOCK_ATTEMPTS", 1)
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    timeline_store.rebuild(user.id)
+    post = Post.objects.create(page=page, content="new post")
+
+    timeline_store.shared.add(timeline_store.lock_key, True)
+    timeline_store.push(post)
+    assert timeline_store.shared.get(timeline_store._key(user.id)) is None
+
+    timeline_store.shared.delete(timeline_store.lock_key)
+    timeline_store.rebuild(user.id)
+    timeline_store.push(Post.objects.create(page=page, content="newer post"))
+    assert len(timeline_store.shared.get(timeline_store._key(user.id))["entries"]) == 2
+
+
+@pytest.mark.django_db
+def test_page_accept_follow_view(client, auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    requesters = [
+        User.objects.create_user(username=f"requester{i}", email=f"requester{i}@gmail.com", password="123")
+        for i in range(6)
+    ]
+    page.follow_requests.add(*requesters)
+    adjust_page_counters(page.id, follow_requests_count=len(requesters))
+    url = reverse("content:pages-accept-follow", kwargs={"uuid": str(page.id)})
+
+    with CaptureQueriesContext(connection) as single:
+        client.post(url, data={"unfollowed_users": [requesters[0].id]}, content_type="application/json",
+                    HTTP_AUTHORIZATION='Token ' + access_token)
+    with CaptureQueriesContext(connection) as several:
+        client.post(url, data={"unfollowed_users": [r.id for r in requesters[1:4]]},
+                    content_type="application/json", HTTP_AUTHORIZATION='Token ' + access_token)
+    response = client.post(url, data={"accept_all": True}, content_type="application/json",
+                           HTTP_AUTHORIZATION='Token ' + access_token)
+
+    page = Page.objects.get(id=page.id)
+    assert response.status_code == 202
+    assert len(several) <= len(single)
+    assert set(requesters) <= set(page.followers.all())
+    assert page.follow_requests.count() == 0
+    assert page.followers_count == 8
+    assert page.follow_requests_count == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_page_counters(auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    Post.objects.create(page=page, content="not counted")
+    Page.objects.filter(id=page.id).update(followers_count=100)
+
+    call_command("reconcile_page_counters")
+
+    page.refresh_from_db()
+    assert (page.followers_count, page.follow_requests_count, page.posts_count) == (1, 1, 1)
+
+    tag = Tag.objects.create(name="drifted")
+    page.tags.add(tag)
+    call_command("reconcile_page_counters")
+    assert Tag.objects.get(id=tag.id).pages_count == 1
+
+
+READ_BUDGETS = {
+    "content:posts-list": 2,
+    "content:posts-detail": 1,
+    "content:posts-followed-pages-posts": 1,
+    "content:pages-list": 2,
+    "content:pages-detail": 2,
+    "content:pages-followers": 3,
+    "content:pages-follow-requests": 3,
+    "content:tags-list": 2,
+    "content:tags-detail": 1,
+    "content:tags-pages": 2,
+    "content:tags-trending": 1,
+}
+
+
+def detail_kwargs(url_name, page):
+    if url_name == "content:posts-detail":
+        return {"pk": page.posts.values_list("id", flat=True).first()}
+    if url_name in ("content:tags-detail", "content:tags-pages"):
+        return {"pk": page.tags.values_list("id", flat=True).first()}
+    if url_name.startswith("content:pages-") and url_name != "content:pages-list":
+        return {"pk": str(page.id)}
+    return {}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 1000])
+@pytest.mark.parametrize("url_name", READ_BUDGETS)
+def test_read_views_query_budget(client, auto_login_user, seeded_page_fixture,
+                                 django_assert_max_num_queries, request_time_budget, url_name, size):
+    access_token, refresh_token, user = auto_login_user()
+    page = seeded_page_fixture(user_instance=user, size=size)
+    url = reverse(url_name, kwargs=detail_kwargs(url_name, page))
+    client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    with django_assert_max_num_queries(READ_BUDGETS[url_name]), request_time_budget():
+        response = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 1000])
+def test_accept_follow_query_budget(client, auto_login_user, seeded_page_fixture, request_time_budget, size):
+    access_token, refresh_token, user = auto_login_user()
+    page = seeded_page_fixture(user_instance=user, size=size)
+    url = reverse("content:pages-accept-follow", kwargs={"uuid": str(page.id)})
+    client.get(reverse("content:tags-list"), HTTP_AUTHORIZATION='Token ' + access_token)
+    followers_table = Page.followers.through._meta.db_table
+
+    with CaptureQueriesContext(connection) as queries, request_time_budget():
+        response = client.post(url, data={"accept_all": True}, content_type="application/json",
+                               HTTP_AUTHORIZATION='Token ' + access_token)
+    # The followers are inserted in as many batches as the backend needs, everything else is budgeted
+    inserts = [
+        query for query in queries.captured_queries
+        if query["sql"].startswith("INSERT") and f'"{followers_table}"' in query["sql"].split("(")[0]
+    ]
+
+    assert response.status_code == 202
+    assert inserts
+    assert len(queries) - len(inserts) <= 7
+
+
+def index_searched_models():
+    """Build the fallback search index, so that refreshing a search document costs queries on every backend"""
+    for model in (Page, Post):
+        if not search_index.uses_postgres(model):
+            search_index.fallback.build(model)
+
+
+def search_refresh_queries(model):
+    """Queries refreshing one search document: a tsvector UPDATE, or a read of the fallback document"""
+    if search_index.uses_postgres(model):
+        return 1
+    # Page documents prefetch their tag names
+    return 2 if model is Page else 1
+
+
+# One statement of room for backends differing in savepoints or conflict handling
+QUERY_BUDGET_SLACK = 1
+
+# (queries besides search, search documents refreshed by model)
+WRITE_BUDGETS = {
+    "create page": (8, {Page: 2}),
+    "update page": (13, {Page: 2}),
+    "follow page": (6, {}),
+    "create tag": (2, {}),
+    "update tag": (4, {Page: 1}),
+}
+
+
+def write_budget(queries, refreshes):
+    search = sum(count * search_refresh_queries(model) for model, count in refreshes.items())
+
+    return queries + search + QUERY_BUDGET_SLACK
+
+
+def write_request(client, name, page, user):
+    tag = page.tags.first()
+    requests = {
+        "create page": (client.post, reverse("content:pages-list"), {
+            "name": "budget page", "description": "budget", "owner": str(user.id), "tags": [tag.id],
+        }),
+        "update page": (client.put, reverse("content:pages-detail", kwargs={"pk": str(page.id)}), {
+            "name": "budget page", "description": "budget", "owner": str(user.id), "tag_names": ["budget tag"],
+        }),
+        "follow page": (client.get, reverse("content:pages-follow", kwargs={"uuid": str(page.id)}), None),
+        "create tag": (client.post, reverse("content:tags-list"), {"name": "budget tag"}),
+        "update tag": (client.put, reverse("content:tags-detail", kwargs={"pk": tag.id}), {"name": "renamed tag"}),
+    }
+    method, url, data = requests[name]
+    if data is None:
+        return lambda **extra: method(url, **extra)
+    return lambda **extra: method(url, data=data, content_type="application/json", **extra)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 1000])
+@pytest.mark.parametrize("name", WRITE_BUDGETS)
+def test_write_views_query_budget(client, auto_login_user, seeded_page_fixture,
+                                  django_assert_max_num_queries, request_time_budget, name, size):
+    access_token, refresh_token, user = auto_login_user()
+    page = seeded_page_fixture(user_instance=user, size=size)
+    send = write_request(client, name, page, user)
+    client.get(reverse("content:tags-list"), HTTP_AUTHORIZATION='Token ' + access_token)
+    index_searched_models()
+
+    with django_assert_max_num_queries(write_budget(*WRITE_BUDGETS[name])), request_time_budget():
+        response = send(HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.status_code < 300
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 1000])
+def test_create_post_query_budget(client, auto_login_user, seeded_page_fixture,
+                                  django_assert_max_num_queries, request_time_budget, size):
+    access_token, refresh_token, user = auto_login_user()
+    page = seeded_page_fixture(user_instance=user, size=size)
+    client.get(reverse("content:tags-list"), HTTP_AUTHORIZATION='Token ' + access_token)
+    index_searched_models()
+
+    with django_assert_max_num_queries(write_budget(3, {Post: 1})), request_time_budget():
+        response = client.post(
+            reverse("content:posts-list"),
+            data={"content": "budget post", "page": str(page.id)},
+            content_type="application/json",
+            HTTP_AUTHORIZATION='Token ' + access_token
+        )
+
+    assert response.status_code == 201
+
+
+def seed_content(owner, size):
+    pages = Page.objects.bulk_create(
+        [Page(name=f"seeded page {i}", description="", owner=owner) for i in range(size)]
+    )
+    Tag.objects.bulk_create([Tag(name=page.id.hex[:30]) for page in pages])
+    tags = Tag.objects.in_bulk([page.id.hex[:30] for page in pages], field_name="name")
+    Page.tags.through.objects.bulk_create(
+        [Page.tags.through(page_id=page.id, tag_id=tags[page.id.hex[:30]].id) for page in pages]
+    )
+    Page.followers.through.objects.bulk_create(
+        [Page.followers.through(page_id=page.id, user_id=owner.id) for page in pages]
+    )
+    Post.objects.bulk_create([Post(page=page, content="seeded post") for page in pages])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", [
+    "content:posts-list",
+    "content:posts-followed-pages-posts",
+    "content:pages-list",
+    "content:tags-list",
+])
+def test_list_views_query_count_does_not_grow(client, auto_login_user, url_name):
+    access_token, refresh_token, user = auto_login_user()
+    url = reverse(url_name)
+    client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    seed_content(user, 1)
+    with CaptureQueriesContext(connection) as small:
+        client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+    seed_content(user, 9)
+    with CaptureQueriesContext(connection) as large:
+        response = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert response.status_code == 200
+    assert len(response.data["results"]) == 10
+    assert len(large) == len(small)
+
+
+@pytest.mark.django_db
+def test_benchmark_example_corpus(tmp_path, settings):
+    User.objects.create_user(username="bench", email="bench@example.com", password="bench-password", role="user")
+    report_path = tmp_path / "report.json"
+
+    call_command(
+        "benchmark", str(Path(settings.BASE_DIR) / "benchmarks" / "corpus.jsonl"), "--output", str(report_path)
+    )
+
+    report = json.loads(report_path.read_text())
+    assert report["errors"] == 0
+    assert "/api/posts/followed-pages-posts/" in report["endpoints"]
+
+
+@pytest.mark.django_db
+def test_benchmark_command(auto_login_user, page_fixture, tmp_path):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    credentials = {"email": user.email, "password": "123"}
+    corpus = tmp_path / "corpus.jsonl"
+    corpus.write_text("\n".join(json.dumps(entry) for entry in [
+        {"method": "GET", "path": "/api/posts/followed-pages-posts/", "auth": credentials},
+        {"method": "GET", "path": f"/api/pages/{page.id}/", "auth": credentials},
+        {"method": "POST", "path": "/login/", "body": credentials},
+    ]))
+    report_path = tmp_path / "report.json"
+
+    call_command("benchmark", str(corpus), "--repeat", "2", "--output", str(report_path))
+
+    report = json.loads(report_path.read_text())
+    assert report["requests"] == 6
+    assert report["errors"] == 0
+    assert set(report["endpoints"]) == {"/api/posts/followed-pages-posts/", "/api/pages/{id}/", "/login/"}
+    assert report["endpoints"]["/api/pages/{id}/"]["queries_per_request"] <= 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_read_views(auto_login_user, page_fixture, rf):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    post = Post.objects.create(page=page, content="async post")
+
+    def get(view, path, **kwargs):
+        request = rf.get(path)
+        request.auth_context = AuthContext.from_token(access_token)
+        return async_to_sync(view)(request, **kwargs)
+
+    feed = json.loads(get(async_views.followed_pages_posts, "/api/posts/followed-pages-posts/").content)
+    posts = json.loads(get(async_views.post_list, "/api/posts/").content)
+    page_detail = json.loads(get(async_views.page_detail, f"/api/pages/{page.id}/", pk=page.id).content)
+
+    assert [item["id"] for item in feed["results"]] == [post.id]
+    assert posts["count"] == 1
+    assert page_detail["id"] == str(page.id)
+    assert page_detail["followers_count"] == 1
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", "replica_0"])
+def test_reads_use_replica_until_user_writes(client, auto_login_user, page_fixture, settings):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    settings.REPLICA_DATABASES = ["replica_0"]
+    detail_url = reverse("content:pages-detail", kwargs={"pk": page.id})
+
+    def queries_by_alias(method, url):
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica_0"]) as replica:
+            response = method(url, HTTP_AUTHORIZATION='Token ' + access_token)
+        return response, len(primary), len(replica)
+
+    response, primary, replica = queries_by_alias(client.get, detail_url)
+    assert response.data["id"] == str(page.id)
+    assert replica
+
+    # Cached thread slices are built on the primary only
+    root = Post.objects.create(page=page, content="root")
+    response, primary, replica = queries_by_alias(
+        client.get, reverse("content:posts-thread", kwargs={"pk": root.id})
+    )
+    assert response.data["id"] == root.id
+    assert primary and not replica
+
+    response, primary, replica = queries_by_alias(
+        client.post, reverse("content:pages-make-page-private", kwargs={"uuid": str(page.id)})
+    )
+    assert response.status_code < 400
+    assert primary and not replica
+    assert is_pinned_to_primary(user.id)
+
+    response, primary, replica = queries_by_alias(client.get, detail_url)
+    assert response.data["id"] == str(page.id)
+    assert primary and not replica
+
+
+@pytest.mark.django_db
+def test_explain_hot_queries_uses_indexes(auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    Post.objects.create(page=page, content="indexed post")
+    out = io.StringIO()
+
+    call_command("explain_hot_queries", "--fail-on-seqscan", stdout=out)
+
+    assert "page-posts: ok" in out.getvalue()
+    assert sequential_scans("3 0 0 SCAN content_post", {"content_post"}) == ["content_post"]
+    assert sequential_scans("Seq Scan on content_page  (cost=0.00..1.01)", {"content_page"}) == ["content_page"]
+
+
+@pytest.mark.django_db
+def test_post_thread_view(client, auto_login_user, page_fixture, django_assert_num_queries):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    root = Post.objects.create(page=page, content="root")
+    first = Post.objects.create(page=page, content="first", reply_to=root)
+    second = Post.objects.create(page=page, content="second", reply_to=root)
+    nested = Post.objects.create(page=page, content="nested", reply_to=first)
+    url = reverse("content:posts-thread", kwargs={"pk": root.id})
+    client.get(reverse("content:tags-list"), HTTP_AUTHORIZATION='Token ' + access_token)
+
+    with django_assert_num_queries(1):
+        thread = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token).data
+    with django_assert_num_queries(0):
+        client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+
+    assert [reply["id"] for reply in thread["replies"]] == [first.id, second.id]
+    assert [reply["id"] for reply in thread["replies"][0]["replies"]] == [nested.id]
+    assert thread["truncated"] is False
+
+    shallow = client.get(url, {"depth": 1, "limit": 2}, HTTP_AUTHORIZATION='Token ' + access_token).data
+    assert [reply["id"] for reply in shallow["replies"]] == [first.id]
+    assert shallow["replies"][0]["replies"] == []
+    assert shallow["truncated"] is True
+
+    response = client.post(
+        reverse("content:posts-list"),
+        data={"content": "late reply", "page": str(page.id), "reply_to": nested.id},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert response.status_code == 201
+
+    thread = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token).data
+    assert [reply["content"] for reply in thread["replies"][0]["replies"][0]["replies"]] == ["late reply"]
+
+    response = client.post(
+        reverse("content:posts-list"),
+        data={"content": "reply to root", "page": str(page.id), "reply_to": root.id},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert response.status_code == 201
+    shallow = client.get(url, {"depth": 1, "limit": 2}, HTTP_AUTHORIZATION='Token ' + access_token).data
+    assert [reply["id"] for reply in shallow["replies"]] == [first.id]
+    assert len(client.get(url, HTTP_AUTHORIZATION='Token ' + access_token).data["replies"]) == 3
+
+    other_page = Page.objects.create(name="other", description="also mine", owner=user)
+    response = client.post(
+        reverse("content:posts-list"),
+        data={"content": "elsewhere", "page": str(other_page.id), "reply_to": root.id},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert response.status_code == 400
+    assert set(response.data) == {"reply_to"}
+    assert client.get(
+        reverse("content:posts-thread", kwargs={"pk": 0}), HTTP_AUTHORIZATION='Token ' + access_token
+    ).status_code == 404
+
+    response = client.delete(
+        reverse("content:pages-detail", kwargs={"pk": page.id}), HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert response.status_code == 202
+    assert client.get(url, HTTP_AUTHORIZATION='Token ' + access_token).status_code == 404
+
+
+@pytest.mark.django_db
+def test_search_views(client, auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    chess = Tag.objects.create(name="chess")
+
+    def create_page(name, description, tags):
+        response = client.post(
+            reverse("content:pages-list"),
+            data={"name": name, "description": description, "owner": str(user.id), "tags": tags},
+            content_type="application/json",
+            HTTP_AUTHORIZATION='Token ' + access_token
+        )
+        assert response.status_code == 201
+
+    def search(url_name, text, **params):
+        response = client.get(reverse(url_name), {"q": text, **params}, HTTP_AUTHORIZATION='Token ' + access_token)
+        assert response.status_code == 200
+        return response.data
+
+    create_page("Chess openings", "weekly puzzles", [chess.id])
+    create_page("Cooking club", "chess players cook too", [Tag.objects.create(name="food").id])
+    create_page("Tagged only", "nothing here", [chess.id])
+
+    found = search("content:pages-search", "chess")
+    assert [result["name"] for result in found["results"]] == ["Chess openings", "Tagged only", "Cooking club"]
+    assert found["results"][0]["rank"] > found["results"][2]["rank"]
+    assert search("content:pages-search", "chess puzzles")["count"] == 1
+    assert search("content:pages-search", "chess", limit=1, offset=1)["results"][0]["name"] == "Tagged only"
+    assert search("content:pages-search", "   ")["count"] == 0
+
+    client.post(
+        reverse("content:posts-list"),
+        data={"content": "Endgame study of the week", "page": str(page.id)},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert [result["content"] for result in search("content:posts-search", "endgame")["results"]] == [
+        "Endgame study of the week"
+    ]
+
+    client.put(
+        reverse("content:pages-detail", kwargs={"pk": str(page.id)}),
+        data={"name": "Endgame corner", "description": "no puzzles", "owner": str(user.id), "tags": [chess.id]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert [result["id"] for result in search("content:pages-search", "endgame")["results"]] == [str(page.id)]
+
+
+@pytest.mark.django_db
+def test_search_follows_model_writes_and_visibility(client, auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    owner = User.objects.create_user(username="owner", email="owner@gmail.com", role="user", password="123")
+    page = page_fixture(user_instance=owner)
+
+    def search(url_name, text):
+        response = client.get(reverse(url_name), {"q": text}, HTTP_AUTHORIZATION='Token ' + access_token)
+        return [result["id"] for result in response.data["results"]]
+
+    assert search("content:pages-search", "test") == [str(page.id)]
+    post = Post.objects.create(page=page, content="Rook endgames")
+    assert search("content:posts-search", "rook") == [post.id]
+
+    page.name = "Renamed"
+    page.save()
+    tag = Tag.objects.create(name="openings")
+    page.tags.add(tag)
+    tag.name = "gambits"
+    tag.save()
+    assert search("content:pages-search", "renamed gambits") == [str(page.id)]
+
+    page.is_private = True
+    page.save(update_fields=["is_private"])
+    assert search("content:pages-search", "renamed") == []
+    assert search("content:posts-search", "rook") == []
+
+    page.followers.add(user)
+    assert search("content:pages-search", "renamed") == [str(page.id)]
+    assert search("content:posts-search", "rook") == [post.id]
+
+    post.delete()
+    assert search("content:posts-search", "rook") == []
+
+
+@pytest.mark.django_db
+def test_tag_discovery_views(client, auto_login_user, page_fixture, monkeypatch):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    games, music, news = (Tag.objects.create(name=name) for name in ("games", "music", "news"))
+    monkeypatch.setattr(trending_tags, "size", 2)
+
+    def create_page(name, tags):
+        response = client.post(
+            reverse("content:pages-list"),
+            data={"name": name, "description": "discovery", "owner": str(user.id), "tags": [tag.id for tag in tags]},
+            content_type="application/json",
+            HTTP_AUTHORIZATION='Token ' + access_token
+        )
+        assert response.status_code == 201
+
+    def trending():
+        response = client.get(reverse("content:tags-trending"), HTTP_AUTHORIZATION='Token ' + access_token)
+        return [(tag["name"], tag["pages_count"]) for tag in response.data]
+
+    create_page("first", [games, music])
+    create_page("second", [games])
+    assert trending() == [("games", 2), ("music", 1)]
+
+    create_page("third", [news])
+    create_page("fourth", [news])
+    create_page("fifth", [news])
+    assert trending() == [("news", 3), ("games", 2)]
+
+    client.put(
+        reverse("content:pages-detail", kwargs={"pk": str(page.id)}),
+        data={"name": "moved", "description": "discovery", "owner": str(user.id), "tags": [music.id]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    client.put(
+        reverse("content:pages-detail", kwargs={"pk": str(page.id)}),
+        data={"name": "moved", "description": "discovery", "owner": str(user.id), "tags": [music.id, games.id]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    client.delete(
+        reverse("content:pages-detail", kwargs={"pk": str(Page.objects.get(name="fourth").id)}),
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    assert trending() == [("games", 3), ("music", 2)]
+
+    pages = client.get(
+        reverse("content:tags-pages", kwargs={"pk": games.id}), HTTP_AUTHORIZATION='Token ' + access_token
+    ).data
+    assert pages["count"] == 3
+    assert pages["results"][0]["id"] == str(page.id)
+
+    def tag_pages_status(pk):
+        return client.get(
+            reverse("content:tags-pages", kwargs={"pk": pk}), HTTP_AUTHORIZATION='Token ' + access_token
+        ).status_code
+
+    assert tag_pages_status(Tag.objects.create(name="untagged").id) == 200
+    assert tag_pages_status(news.id + 1000) == 404
+    assert tag_pages_status("not-a-tag") == 404
+
+    # A patch that cannot lock the list drops it instead of racing another one
+    trending_tags.shared.add(trending_tags.lock_key, True)
+    monkeypatch.setattr(trending_tags, "patch", None)
+    monkeypatch.setattr(innotter_caches.time, "sleep", lambda seconds: None)
+    trending_tags.update({games.id})
+    assert trending_tags.shared.get(trending_tags.key) is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 10, 100])
+def test_page_tags_written_in_bulk(client, auto_login_user, size):
+    access_token, refresh_token, user = auto_login_user()
+    existing = [Tag.objects.create(name=f"existing {i}").id for i in range(size)]
+    client.get(reverse("content:tags-list"), HTTP_AUTHORIZATION='Token ' + access_token)
+
+    def tag_writes(queries):
+        return [
+            query["sql"].split()[0] for query in queries.captured_queries
+            if "content_page_tags" in query["sql"] and not query["sql"].startswith("SELECT")
+        ]
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(
+            reverse("content:pages-list"),
+            data={
+                "name": "bulk tags",
+                "description": "bulk",
+                "owner": str(user.id),
+                "tags": existing,
+                "tag_names": [f"new {i}" for i in range(size)] + ["existing 0"],
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION='Token ' + access_token
+        )
+    assert response.status_code == 201
+    assert tag_writes(queries) == ["INSERT"]
+    assert len(queries) <= 13
+
+    page = Page.objects.get(name="bulk tags")
+    assert page.tags.count() == 2 * size
+    assert set(Tag.objects.filter(id__in=existing).values_list("pages_count", flat=True)) == {1}
+
+    with CaptureQueriesContext(connection) as queries:
+        client.put(
+            reverse("content:pages-detail", kwargs={"pk": str(page.id)}),
+            data={
+                "name": "bulk tags",
+                "description": "bulk",
+                "owner": str(user.id),
+                "tags": existing[1:],
+                "tag_names": ["replacement"],
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION='Token ' + access_token
+        )
+    assert tag_writes(queries) == ["DELETE", "INSERT"]
+    assert sorted(page.tags.values_list("name", flat=True)) == sorted(
+        [f"existing {i}" for i in range(1, size)] + ["replacement"]
+    )
+    assert Tag.objects.get(id=existing[0]).pages_count == 0
+
+
+@pytest.mark.django_db
+def test_import_posts_view(client, auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    other_page = Page.objects.create(name="other", description="not mine", owner=User.objects.get(
+        username="follower_for_test_page"
+    ))
+    second_page = Page.objects.create(name="second", description="also mine", owner=user)
+    root = Post.objects.create(page=page, content="root")
+    User.objects.filter(id=user.id).update(role="user")
+    lines = [
+        {"page": str(page.id), "content": "first"},
+        {"page": str(page.id), "content": "reply", "reply_to": root.id},
+        {"page": str(other_page.id), "content": "not my page"},
+        {"page": str(page.id), "content": "x" * 181},
+        {"page": str(page.id), "content": "third"},
+        {"page": str(second_page.id), "content": "reply elsewhere", "reply_to": root.id},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines[:2]) + "\n{broken\n" + "\n".join(
+        json.dumps(line) for line in lines[2:]
+    )
+
+    response = client.post(
+        reverse("content:posts-import") + "?batch_size=2",
+        data=body,
+        content_type="application/x-ndjson",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+
+    assert response.status_code == 201
+    assert response.data["created"] == 3
+    assert [error["record"] for error in response.data["errors"]] == [3, 4, 5, 7]
+    assert set(response.data["errors"][1]["errors"]) == {"page"}
+    assert set(response.data["errors"][3]["errors"]) == {"reply_to"}
+    assert sorted(page.posts.values_list("content", flat=True)) == ["first", "reply", "root", "third"]
+    assert Page.objects.get(id=page.id).posts_count == 3
+    assert root.replies.count() == 1
+
+
+@pytest.mark.django_db
+def test_import_pages(client, auto_login_user, monkeypatch, tmp_path):
+    access_token, refresh_token, user = auto_login_user()
+    games = Tag.objects.create(name="games")
+    User.objects.filter(id=user.id).update(role="user")
+    monkeypatch.setattr("apps.content.imports.READ_SIZE", 7)
+    records = [
+        {"name": f"imported {i}", "description": "legacy", "tags": [games.id], "tag_names": ["legacy", "games"]}
+        for i in range(5)
+    ]
+    records.append({"name": "foreign", "description": "legacy", "owner": user.id + 1000})
+
+    response = client.post(
+        reverse("content:pages-import"),
+        data=json.dumps(records, indent=1),
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+
+    assert response.status_code == 201
+    assert (response.data["created"], response.data["failed"]) == (5, 1)
+    assert Page.objects.filter(owner=user, tags=games).count() == 5
+    assert Tag.objects.get(name="legacy").pages_count == 5
+    assert Tag.objects.get(id=games.id).pages_count == 5
+
+    source = tmp_path / "pages.ndjson"
+    source.write_text(
+        json.dumps({"name": "from command", "description": "", "owner": user.id, "tag_names": ["legacy"]})
+        + "\n" + json.dumps({"name": "ownerless", "description": ""}) + "\n"
+    )
+    out = io.StringIO()
+    call_command("import_content", "pages", str(source), "--batch-size", "1", stdout=out, stderr=io.StringIO())
+
+    assert "Imported 1 pages, 1 records failed" in out.getvalue()
+    assert Tag.objects.get(name="legacy").pages_count == 6
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 1000])
+def test_export_views(client, auto_login_user, seeded_page_fixture, django_assert_max_num_queries, size):
+    access_token, refresh_token, user = auto_login_user()
+    page = seeded_page_fixture(user_instance=user, size=size)
+    client.get(reverse("content:tags-list"), HTTP_AUTHORIZATION='Token ' + access_token)
+    url = reverse("content:pages-export-posts", kwargs={"pk": str(page.id)})
+
+    with django_assert_max_num_queries(3):
+        response = client.get(url, HTTP_AUTHORIZATION='Token ' + access_token)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+
+    assert response["Content-Type"] == "application/x-ndjson"
+    assert len(lines) == page.posts.count()
+    assert set(json.loads(lines[0])) == {"id", "content", "reply_to", "created_at"}
+
+    response = client.get(
+        reverse("content:pages-export-followers", kwargs={"pk": str(page.id)}),
+        {"output": "csv"},
+        HTTP_AUTHORIZATION='Token ' + access_token
+    )
+    rows = b"".join(response.streaming_content).decode().splitlines()
+    assert rows[0] == "id,username"
+    assert len(rows) == page.followers.count() + 1
+
+    assert client.get(url, {"output": "xml"}, HTTP_AUTHORIZATION='Token ' + access_token).status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", [1, 100])
+def test_moderation_view(client, auto_login_user, page_fixture, monkeypatch, django_assert_max_num_queries, size):
+    monkeypatch.setattr(timeline_store, "enabled", True)
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    page.followers.add(user)
+    Post.objects.create(page=page, content="spam post")
+    User.objects.bulk_create([
+        User(username=f"spammer_{i}", email=f"spammer_{i}@gmail.com", role="user") for i in range(size)
+    ])
+    spammer_ids = list(User.objects.filter(username__startswith="spammer_").values_list("id", flat=True))
+    url = reverse("content:moderation-list")
+    feed_url = reverse("content:posts-followed-pages-posts")
+    unblock_date = "2100-01-01T00:00:00Z"
+
+    client.get(feed_url, HTTP_AUTHORIZATION='Token ' + access_token)
+    with django_assert_max_num_queries(5):
+        blocked = client.post(
+            url,
+            data={"action": "block", "users": spammer_ids, "pages": [str(page.id)], "unblock_date": unblock_date},
+            content_type="application/json",
+            HTTP_AUTHORIZATION='Token ' + access_token,
+        )
+    feed = client.get(feed_url, HTTP_AUTHORIZATION='Token ' + access_token)
+    page.refresh_from_db()
+
+    assert blocked.status_code == 202
+    assert blocked.data == {"users": size, "pages": 1}
+    assert User.objects.filter(id__in=spammer_ids, is_blocked=True).count() == size
+    assert page.is_blocked and page.unblock_date.year == 2100
+    assert feed.data["results"] == []
+
+    # Posts written while blocked are neither pushed nor read from a stale timeline
+    client.post(
+        reverse("content:posts-list"),
+        data={"content": "blocked post", "page": str(page.id)},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token,
+    )
+    assert client.get(feed_url, HTTP_AUTHORIZATION='Token ' + access_token).data["results"] == []
+    timeline_store.shared.set(
+        timeline_store._key(user.id),
+        dict(timeline_store.rebuild(user.id), entries=list(Post.objects.values_list("created_at", "id"))),
+    )
+    assert client.get(feed_url, HTTP_AUTHORIZATION='Token ' + access_token).data["results"] == []
+
+    unblocked = client.post(
+        url,
+        data={"action": "unblock", "pages": [str(page.id)]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token,
+    )
+    page.refresh_from_db()
+
+    assert unblocked.data == {"users": 0, "pages": 1}
+    assert not page.is_blocked and page.unblock_date is None
+    assert len(client.get(feed_url, HTTP_AUTHORIZATION='Token ' + access_token).data["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_moderation_view_requires_moderator(client, auto_login_user):
+    access_token, refresh_token, user = auto_login_user()
+    User.objects.filter(id=user.id).update(role="user")
+
+    response = client.post(
+        reverse("content:moderation-list"),
+        data={"action": "block", "users": [user.id]},
+        content_type="application/json",
+        HTTP_AUTHORIZATION='Token ' + access_token,
+    )
+
+    assert response.status_code == 403
+    assert not User.objects.get(id=user.id).is_blocked
+
+
+@pytest.mark.django_db
+def test_unblock_sweeper(auto_login_user, monkeypatch, caplog):
+    access_token, refresh_token, user = auto_login_user()
+    now = timezone.now()
+    pages = Page.objects.bulk_create([Page(name=f"blocked page {i}", description="", owner=user) for i in range(3)])
+    Page.objects.filter(pk=pages[0].pk).update(is_blocked=True, unblock_date=now - timedelta(seconds=5))
+    Page.objects.filter(pk=pages[1].pk).update(is_blocked=True, unblock_date=now + timedelta(seconds=30))
+    Page.objects.filter(pk=pages[2].pk).update(is_blocked=True)
+    sweeper = UnblockSweeper(batch_size=1, max_sleep=60)
+
+    sweeps = []
+
+    with caplog.at_level(logging.INFO, logger="apps.content.sweeper"):
+        sleep = sweeper.run_once(on_sweep=lambda unblocked, metrics: sweeps.append((unblocked, metrics)))
+
+    assert list(Page.objects.filter(is_blocked=False).values_list("pk", flat=True)) == [pages[0].pk]
+    assert 0 < sleep <= 30
+    assert sweeper.snapshot()["unblocked"] == 1
+    assert sweeper.snapshot()["max_lag_seconds"] >= 5
+    assert sweeps == [(1, sweeper.snapshot())]
+    assert "Unblocked 1 pages" in caplog.text
+
+    monkeypatch.setattr(timezone, "now", lambda: now + timedelta(seconds=31))
+    sweeper.run_once(on_sweep=lambda unblocked, metrics: sweeps.append((unblocked, metrics)))
+
+    assert [unblocked for unblocked, metrics in sweeps] == [1, 1]
+    assert sweeps[-1][1]["sweeps"] == 2
+
+    assert set(Page.objects.filter(is_blocked=False).values_list("pk", flat=True)) == {pages[0].pk, pages[1].pk}
+    assert Page.objects.get(pk=pages[2].pk).is_blocked
+
+
+@pytest.mark.django_db
+def test_sweep_unblocks_command(auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    Page.objects.filter(pk=page.pk).update(is_blocked=True, unblock_date=timezone.now())
+    out = io.StringIO()
+
+    call_command("sweep_unblocks", "--once", stdout=out)
+    page.refresh_from_db()
+
+    assert not page.is_blocked and page.unblock_date is None
+    assert "Unblocked 1 pages" in out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_export_streams_from_event_loop(auto_login_user, page_fixture):
+    access_token, refresh_token, user = auto_login_user()
+    page = page_fixture(user_instance=user)
+    Post.objects.bulk_create([Post(page=page, content=f"exported post {i}") for i in range(3)])
+    response = export_response(
+        Post.objects.filter(page=page).order_by("id"), {"id": "id", "content": "content"}, "ndjson", "posts"
+    )
+
+    async def consume():
+        return b"".join(response)
+
+    body = async_to_sync(consume)()
+    response.close()
+
+    assert [json.loads(line)["content"] for line in body.splitlines()] == [f"exported post {i}" for i in range(3)]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool_caps_worker_connections():
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    pool = ConnectionPool(size=2, timeout=0.05)
+    first, second = pool.borrow(connect), pool.borrow(connect)
+    with pytest.raises(OperationalError):
+        pool.borrow(connect)
+
+    pool.give_back(first)
+    assert pool.borrow(connect) is first
+    assert len(opened) == 2
+
+    waiting = []
+    waiter = threading.Thread(target=lambda: waiting.append(pool.borrow(connect)))
+    pool.timeout = 5
+    waiter.start()
+    pool.give_back(second)
+    waiter.join()
+    assert waiting == [second]
+
+    # A connection failing its check is closed and replaced
+    pool.give_back(first)
+    replaced = pool.borrow(connect, check=lambda connection: False)
+    assert first.closed and replaced is opened[-1] and len(opened) == 3
 
+    # Connections past their max age and unusable ones are closed on return
+    pool.max_age = 0
+    pool.give_back(replaced)
+    pool.give_back(second, reusable=False)
+    assert replaced.closed and second.closed
+    assert pool.opened_at == {} and pool.idle == []
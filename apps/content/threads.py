@@ -0,0 +1,149 @@
+import uuid
+
+from django.core.cache import caches
+from django.db import router
+
+from rest_framework.fields import DateTimeField
+
+from apps.content.models import Post
+from innotter.settings import (
+    THREAD_CACHE_ALIAS,
+    THREAD_CACHE_TTL,
+    THREAD_MAX_DEPTH,
+)
+
+THREAD_QUERY = """
+    WITH RECURSIVE thread (id, depth) AS (
+        SELECT id, 0 FROM {table} WHERE id = %s
+        UNION ALL
+        SELECT reply.id, thread.depth + 1
+        FROM {table} reply JOIN thread ON reply.reply_to_id = thread.id
+        WHERE thread.depth < %s
+    )
+    SELECT post.id, post.page_id, post.content, post.reply_to_id, post.created_at, thread.depth
+    FROM thread JOIN {table} post ON post.id = thread.id
+    ORDER BY thread.depth, post.created_at, post.id
+    LIMIT %s
+"""
+
+ANCESTORS_QUERY = """
+    WITH RECURSIVE ancestors (id, reply_to_id, depth) AS (
+        SELECT id, reply_to_id, 0 FROM {table} WHERE id = %s
+        UNION ALL
+        SELECT post.id, post.reply_to_id, ancestors.depth + 1
+        FROM {table} post JOIN ancestors ON post.id = ancestors.reply_to_id
+        WHERE ancestors.depth < %s
+    )
+    SELECT id FROM ancestors
+"""
+
+
+created_at_field = DateTimeField()
+
+
+class ThreadStore:
+    """
+    Reply trees of posts, fetched breadth first with one recursive query and
+    cached per (root post, depth, limit) slice. Slice keys carry a version
+    token of the root, so a post below the root changing drops every slice
+    of it by replacing one key, with no read-modify-write of shared entries.
+    Slices are built on the primary database, as one read from a lagging
+    replica right after an invalidation would be cached for the whole TTL.
+    """
+
+    key_prefix = "thread"
+    version_prefix = "thread-version"
+
+    def __init__(self, alias, ttl, max_depth):
+        self.alias = alias
+        self.ttl = ttl
+        self.max_depth = max_depth
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _version_key(self, post_id):
+        return f"{self.version_prefix}:{post_id}"
+
+    def _key(self, post_id, version, depth, limit):
+        return f"{self.key_prefix}:{post_id}:{version}:{depth}:{limit}"
+
+    def version(self, post_id):
+        """Current version token of the threads under ``post_id``, started when missing"""
+        key = self._version_key(post_id)
+        version = self.shared.get(key)
+        if version is None:
+            self.shared.add(key, uuid.uuid4().hex, timeout=self.ttl)
+            version = self.shared.get(key)
+
+        return version
+
+    def get(self, post_id, depth, limit):
+        """Nested thread under ``post_id``, or None when the post does not exist"""
+        key = self._key(post_id, self.version(post_id), depth, limit)
+
+        thread = self.shared.get(key)
+        if thread is None:
+            thread = self.build(post_id, depth, limit)
+            if thread is None:
+                return None
+            self.shared.set(key, thread, timeout=self.ttl)
+
+        return thread
+
+    def build(self, post_id, depth, limit):
+        posts = list(Post.objects.raw(
+            THREAD_QUERY.format(table=Post._meta.db_table),
+            [post_id, depth, limit + 1],
+            using=router.db_for_write(Post),
+        ))
+        if not posts:
+            return None
+
+        truncated = len(posts) > limit
+        nodes = {}
+        for post in posts[:limit]:
+            node = {
+                "id": post.id,
+                "page": post.page_id,
+                "content": post.content,
+                "reply_to": post.reply_to_id,
+                "created_at": created_at_field.to_representation(post.created_at),
+                "replies": [],
+            }
+            nodes[post.id] = node
+            if post.depth:
+                nodes[post.reply_to_id]["replies"].append(node)
+
+        return dict(nodes[post_id], truncated=truncated)
+
+    def invalidate(self, post_id):
+        """Forget cached threads of the post and of every post it replies to, directly or not"""
+        ancestors = Post.objects.raw(
+            ANCESTORS_QUERY.format(table=Post._meta.db_table),
+            [post_id, self.max_depth],
+            using=router.db_for_write(Post),
+        )
+        self.shared.delete_many([self._version_key(post.id) for post in ancestors])
+
+    def drop_page(self, page_id):
+        """
+        Forget cached threads holding posts of a page about to be deleted:
+        those rooted at its posts, and above posts of other pages they reply
+        to, which only replies created before those were rejected can do.
+        """
+        posts = dict(
+            Post.objects.using(router.db_for_write(Post)).filter(page_id=page_id).values_list("id", "reply_to_id")
+        )
+        self.shared.delete_many([self._version_key(post_id) for post_id in posts])
+
+        for reply_to_id in set(posts.values()) - set(posts) - {None}:
+            self.invalidate(reply_to_id)
+
+
+thread_store = ThreadStore(
+    alias=THREAD_CACHE_ALIAS,
+    ttl=THREAD_CACHE_TTL,
+    max_depth=THREAD_MAX_DEPTH,
+)
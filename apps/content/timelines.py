@@ -0,0 +1,206 @@
+from django.core.cache import caches
+
+from apps.content.models import Page, Post
+from apps.content.pagination import older_than
+from innotter.caches import cache_lock
+from innotter.settings import (
+    FEED_FANOUT_ENABLED,
+    FEED_FANOUT_MAX_FOLLOWERS,
+    FEED_TIMELINE_CACHE_ALIAS,
+    FEED_TIMELINE_SIZE,
+    FEED_TIMELINE_TTL,
+)
+
+PUSH_LOCK_TIMEOUT = 5
+PUSH_LOCK_ATTEMPTS = 50
+PUSH_LOCK_WAIT = 0.01
+
+
+def followed_page_ids(user_id):
+    """Ids of the pages whose posts make up the feed of a user, blocked pages left out"""
+    return Page.followers.through.objects.filter(user_id=user_id, page__is_blocked=False).values("page_id")
+
+
+class TimelineStore:
+    """
+    Precomputed followed-pages feeds. A new post is pushed into the cached
+    timeline of every follower of its page, except for pages with more than
+    ``max_fanout`` followers: those are pulled from the database at read time
+    and merged in. Timelines hold at most ``size`` newest (created_at, id)
+    entries and are rebuilt lazily after being invalidated, or when a
+    followed page crossed ``max_fanout`` since they were built.
+
+    Pushes, removals, rebuilds and invalidations hold a shared-cache lock,
+    so none of them writes back a timeline changed or deleted since it was
+    read. A rebuild that cannot get the lock serves its result uncached.
+    """
+
+    key_prefix = "timeline"
+    lock_key = "timeline:lock"
+
+    def __init__(self, alias, size, max_fanout, ttl, enabled):
+        self.alias = alias
+        self.size = size
+        self.max_fanout = max_fanout
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}:{user_id}"
+
+    def read(self, user_id, position, count):
+        """
+        (created_at, id) positions of up to ``count`` feed posts older than
+        ``position``, or None when the stored timeline does not reach that
+        far back.
+        """
+        pull_pages = self.pull_page_ids(user_id)
+        timeline = self.shared.get(self._key(user_id))
+        if timeline is None or set(timeline["pull_pages"]) != set(pull_pages):
+            timeline = self.rebuild(user_id, pull_pages)
+
+        entries = timeline["entries"]
+        if position is not None:
+            entries = [entry for entry in entries if entry < position]
+
+        if len(entries) < count and not timeline["complete"]:
+            return None
+        entries = entries[:count]
+
+        if pull_pages:
+            pulled = Post.objects.filter(page_id__in=pull_pages)
+            if position is not None:
+                pulled = older_than(pulled, position)
+            pulled = pulled.order_by("-created_at", "-id").values_list("created_at", "id")[:count]
+            entries = sorted(set(entries) | set(pulled), reverse=True)[:count]
+
+        return entries
+
+    def pull_page_ids(self, user_id):
+        return list(
+            Page.objects.filter(id__in=followed_page_ids(user_id), followers_count__gt=self.max_fanout)
+            .values_list("id", flat=True)
+        )
+
+    def rebuild(self, user_id, pull_pages=None):
+        if pull_pages is None:
+            pull_pages = self.pull_page_ids(user_id)
+
+        # Posts pushed while the query runs wait for the lock and land on top of it
+        with self._lock() as locked:
+            entries = list(
+                Post.objects.filter(page_id__in=followed_page_ids(user_id))
+                .exclude(page_id__in=pull_pages)
+                .order_by("-created_at", "-id")
+                .values_list("created_at", "id")[:self.size]
+            )
+
+            timeline = {
+                "entries": entries,
+                "pull_pages": pull_pages,
+                "complete": len(entries) < self.size,
+            }
+            if locked:
+                self.shared.set(self._key(user_id), timeline, timeout=self.ttl)
+
+        return timeline
+
+    def push(self, post):
+        if not self.enabled or post.page.is_blocked:
+            return
+
+        def add(entries):
+            entries.append((post.created_at, post.id))
+            entries.sort(reverse=True)
+
+        self._patch(post.page_id, add)
+
+    def remove(self, page_id, post_id):
+        """Take a deleted post out of the timelines of its page's followers"""
+        if not self.enabled:
+            return
+
+        def discard(entries):
+            entries[:] = [entry for entry in entries if entry[1] != post_id]
+
+        self._patch(page_id, discard)
+
+    def _patch(self, page_id, change):
+        """Apply ``change`` to the entries of every cached timeline of the page's followers"""
+        follower_ids = self._fanout_follower_ids(page_id)
+        if follower_ids is None:
+            return
+
+        keys = [self._key(user_id) for user_id in follower_ids]
+        with self._lock() as locked:
+            if not locked:
+                # Rebuilding a timeline is cheaper than waiting any longer
+                self.shared.delete_many(keys)
+                return
+
+            timelines = self.shared.get_many(keys)
+            for timeline in timelines.values():
+                entries = timeline["entries"]
+                change(entries)
+                if len(entries) > self.size:
+                    del entries[self.size:]
+                    timeline["complete"] = False
+
+            self.shared.set_many(timelines, timeout=self.ttl)
+
+    def _lock(self):
+        return cache_lock(self.shared, self.lock_key, PUSH_LOCK_TIMEOUT, PUSH_LOCK_ATTEMPTS, PUSH_LOCK_WAIT)
+
+    def invalidate(self, *user_ids):
+        if not self.enabled:
+            return
+
+        with self._lock():
+            self.shared.delete_many([self._key(user_id) for user_id in user_ids])
+
+    def drop_page(self, page_id):
+        """Forget timelines that may hold posts of a page about to be deleted"""
+        if not self.enabled:
+            return
+
+        follower_ids = self._fanout_follower_ids(page_id)
+        if follower_ids is not None:
+            self.invalidate(*follower_ids)
+
+    def drop_pages(self, *page_ids):
+        """
+        Forget timelines holding posts of pages about to be hidden, with one
+        query for all pages. Pages too big to fan out are pulled at read
+        time, which skips blocked pages by itself.
+        """
+        if not self.enabled or not page_ids:
+            return
+
+        follower_ids = Page.followers.through.objects.filter(
+            page_id__in=page_ids, page__followers_count__lte=self.max_fanout
+        ).values_list("user_id", flat=True).distinct()
+        self.invalidate(*follower_ids)
+
+    def _fanout_follower_ids(self, page_id):
+        """Follower ids of a page, or None when it is too big to fan out"""
+        follower_ids = list(
+            Page.followers.through.objects.filter(page_id=page_id)
+            .values_list("user_id", flat=True)[:self.max_fanout + 1]
+        )
+        if len(follower_ids) > self.max_fanout:
+            return None
+
+        return follower_ids
+
+
+timeline_store = TimelineStore(
+    alias=FEED_TIMELINE_CACHE_ALIAS,
+    size=FEED_TIMELINE_SIZE,
+    max_fanout=FEED_FANOUT_MAX_FOLLOWERS,
+    ttl=FEED_TIMELINE_TTL,
+    enabled=FEED_FANOUT_ENABLED,
+)
@@ -0,0 +1,87 @@
+from django.core.cache import caches
+
+from apps.content.models import Tag
+from innotter.caches import cache_lock
+from innotter.settings import (
+    TAG_TRENDING_CACHE_ALIAS,
+    TAG_TRENDING_SIZE,
+    TAG_TRENDING_TTL,
+)
+
+
+def rank_key(tag):
+    return -tag["pages_count"], tag["id"]
+
+
+class TrendingTags:
+    """
+    The ``size`` tags with most pages, cached as a list and patched with the
+    new counts of changed tags instead of being re-sorted from the table.
+    A listed tag losing pages while the list is full may let an unlisted tag
+    overtake it, so that case drops the list to be rebuilt on the next read.
+    Patches hold a shared-cache lock so concurrent ones cannot undo each
+    other, a patch that cannot get it drops the list as well.
+    """
+
+    key = "trending-tags"
+    lock_key = "trending-tags:lock"
+
+    def __init__(self, alias, size, ttl):
+        self.alias = alias
+        self.size = size
+        self.ttl = ttl
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def top(self, count):
+        tags = self.shared.get(self.key)
+        if tags is None:
+            tags = self.rebuild()
+
+        return tags[:count]
+
+    def rebuild(self):
+        tags = list(
+            Tag.objects.filter(pages_count__gt=0).order_by("-pages_count", "id")
+            .values("id", "name", "pages_count")[:self.size]
+        )
+        self.shared.set(self.key, tags, timeout=self.ttl)
+
+        return tags
+
+    def update(self, tag_ids):
+        if not tag_ids:
+            return
+
+        with cache_lock(self.shared, self.lock_key) as locked:
+            if not locked:
+                self.shared.delete(self.key)
+                return
+
+            tags = self.shared.get(self.key)
+            if tags is not None:
+                self.patch(tags, tag_ids)
+
+    def patch(self, tags, tag_ids):
+        changed = {tag["id"]: tag for tag in Tag.objects.filter(pk__in=tag_ids).values("id", "name", "pages_count")}
+        listed = {tag["id"]: tag["pages_count"] for tag in tags}
+        if len(tags) >= self.size and any(
+            tag_id not in changed or changed[tag_id]["pages_count"] < listed[tag_id]
+            for tag_id in tag_ids if tag_id in listed
+        ):
+            self.shared.delete(self.key)
+            return
+
+        tags = [tag for tag in tags if tag["id"] not in tag_ids]
+        tags.extend(tag for tag in changed.values() if tag["pages_count"] > 0)
+        tags.sort(key=rank_key)
+        self.shared.set(self.key, tags[:self.size], timeout=self.ttl)
+
+
+trending_tags = TrendingTags(
+    alias=TAG_TRENDING_CACHE_ALIAS,
+    size=TAG_TRENDING_SIZE,
+    ttl=TAG_TRENDING_TTL,
+)
@@ -4,7 +4,9 @@ from apps.content.views import (
     PostViewSet,
     TagViewSet,
     PageViewSet,
+    ModerationViewSet,
 )
+from innotter.settings import ASYNC_READ_VIEWS
 
 app_name = "content"
 
@@ -13,7 +15,17 @@ router = DefaultRouter()
 router.register(r"posts", PostViewSet, basename="posts")
 router.register(r"tags", TagViewSet, basename="tags")
 router.register(r"pages", PageViewSet, basename="pages")
+router.register(r"moderation", ModerationViewSet, basename="moderation")
 
 urlpatterns = [
     path("api/", include(router.urls)),
     ]
+
+if ASYNC_READ_VIEWS:
+    from apps.content import async_views
+
+    urlpatterns = [
+        path("api/posts/", async_views.post_list),
+        path("api/posts/followed-pages-posts/", async_views.followed_pages_posts),
+        path("api/pages/<uuid:pk>/", async_views.page_detail),
+    ] + urlpatterns
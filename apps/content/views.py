@@ -1,11 +1,15 @@
+import io
+
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, Q
 
 from rest_framework import viewsets, mixins, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 
 from apps.authentication.backends import JWTAuthentication
 
@@ -20,18 +24,91 @@ from apps.content.serializers import (
     PostRetrieveSerializer,
     PostCreateSerializer,
     PostUpdateSerializer,
+    PostSearchSerializer,
     TagListAndRetrieveSerializer,
+    TagTrendingSerializer,
     TagUpdateSerializer,
     TagCreateSerializer,
     PageListSerializer,
     PageRetrieveSerializer,
+    PageFollowerSerializer,
+    PageSearchSerializer,
     PageCreateSerializer,
     PageUpdateSerializer,
+    AcceptFollowSerializer,
+    ModerationSerializer,
+)
+from apps.content.counters import adjust_page_counters
+from apps.content.exports import OUTPUTS, export_response
+from apps.content.imports import PageImporter, PostImporter, iter_records
+from apps.content.pagination import KeysetPagination
+from apps.content.search import search_index
+from apps.content.tagging import record_tag_changes
+from apps.content.threads import thread_store
+from apps.content.timelines import followed_page_ids, timeline_store
+from apps.content.trending import trending_tags
+from innotter.db.replicas import ReplicaReadMixin
+from innotter.settings import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_MAX_BATCH_SIZE,
+    TAG_TRENDING_SIZE,
+    THREAD_MAX_DEPTH,
+    THREAD_MAX_POSTS,
+    THREAD_PAGE_SIZE,
 )
 
 User = get_user_model()
 
 
+def paginate_followed_pages_posts(queryset, user_id, paginator, request):
+    """One keyset page of the feed, read from the timeline store when it is enabled"""
+    feed = queryset.filter(page_id__in=followed_page_ids(user_id))
+
+    if timeline_store.enabled:
+        positions = timeline_store.read(
+            user_id,
+            paginator.decode_cursor(request),
+            paginator.get_page_size(request) + 1,
+        )
+        if positions is not None:
+            return paginator.paginate_positions(queryset.filter(page__is_blocked=False), request, positions)
+
+    return paginator.paginate_queryset(feed, request)
+
+
+def visible_to(user_id, prefix=""):
+    """Pages a user may see: public ones, their own and the private ones they follow"""
+    followed = Page.followers.through.objects.filter(user_id=user_id).values("page_id")
+
+    return (
+        Q(**{f"{prefix}is_private": False})
+        | Q(**{f"{prefix}owner_id": user_id})
+        | Q(**{f"{prefix}id__in": followed})
+    )
+
+
+def bounded_query_param(request, name, default, maximum):
+    try:
+        value = int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+    if value < 0:
+        return default
+    return min(value, maximum)
+
+
+def import_records(importer_class, request):
+    """Run an import over the raw request body, streamed rather than parsed into request.data"""
+    batch_size = bounded_query_param(request, "batch_size", IMPORT_BATCH_SIZE, IMPORT_MAX_BATCH_SIZE)
+    owner_id = None if request.user.role == "admin" else request.user.id
+    importer = importer_class(batch_size or IMPORT_BATCH_SIZE, owner_id=owner_id)
+
+    report = importer.run(iter_records(request.stream or io.BytesIO()))
+
+    return Response(report, status=status.HTTP_201_CREATED if report["created"] else status.HTTP_400_BAD_REQUEST)
+
+
 class IsAdminUser(BasePermission):
     def has_permission(self, request, view):
         if request.user.role == "admin" or "moderator":
@@ -39,33 +116,76 @@ class IsAdminUser(BasePermission):
         return False
 
 
+class IsModerator(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.role in ("admin", "moderator")
+
+
 class PostViewSet(
+    ReplicaReadMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
 ):
-    permission_classes = (IsAdminUser | IsAuthenticated)
+    permission_classes = [IsAdminUser | IsAuthenticated]
     authentication_classes = (JWTAuthentication,)
+    replica_actions = ("list", "retrieve", "search")
     queryset = Post.objects.all()
+    querysets = {
+        "list": Post.objects.only("id", "page_id"),
+        "retrieve": Post.objects.only("id", "content", "page_id"),
+        "list_followed_pages_posts": Post.objects.only("id", "page_id", "created_at"),
+        "search": Post.objects.only("id", "content", "page_id"),
+    }
     serializer_classes = {
         "list": PostListSerializer,
         "retrieve": PostRetrieveSerializer,
         "update": PostUpdateSerializer,
         "create": PostCreateSerializer,
+        "search": PostSearchSerializer,
     }
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, PostListSerializer)
 
-    @action(methods=['GET', ], url_path="followed-pages-posts", url_name="followed-pages-posts", detail=False)
+    def get_queryset(self):
+        return self.querysets.get(self.action, self.queryset).all()
+
+    @action(methods=['GET', ], url_path="followed-pages-posts", url_name="followed-pages-posts", detail=False,
+            pagination_class=KeysetPagination)
     def list_followed_pages_posts(self, request):
-        posts = Post.objects.filter(
-            page_id__in=[page.id for page in Page.objects.all().filter(followers=request.user.id)])
+        posts = paginate_followed_pages_posts(self.get_queryset(), request.user.id, self.paginator, request)
         serializer = self.get_serializer(posts, many=True)
 
-        return Response(data=serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET', ], url_path="search", url_name="search", detail=False)
+    def search(self, request):
+        posts = self.get_queryset().filter(visible_to(request.user.id, prefix="page__"))
+        results = self.paginate_queryset(search_index.search(posts, request.query_params.get("q", "")))
+        serializer = self.get_serializer(results, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['POST', ], url_path="import", url_name="import", detail=False)
+    def import_posts(self, request):
+        return import_records(PostImporter, request)
+
+    @action(methods=['GET', ], url_path="thread", url_name="thread", detail=True)
+    def thread(self, request, pk=None):
+        depth = bounded_query_param(request, "depth", THREAD_MAX_DEPTH, THREAD_MAX_DEPTH)
+        limit = bounded_query_param(request, "limit", THREAD_PAGE_SIZE, THREAD_MAX_POSTS) or THREAD_PAGE_SIZE
+
+        try:
+            thread = thread_store.get(int(pk), depth, limit)
+        except ValueError:
+            thread = None
+        if thread is None:
+            raise NotFound()
+
+        return Response(thread)
 
     def update(self, request, pk=None):
         post = get_object_or_404(Post, pk=pk)
@@ -78,12 +198,17 @@ class PostViewSet(
         post = get_object_or_404(Post, pk=pk)
 
         if request.user.id == Page.objects.get(id=post.page_id).owner_id:
+            post_id = post.id
+            thread_store.invalidate(post_id)
             post.delete()
+            adjust_page_counters(post.page_id, posts_count=-1)
+            timeline_store.remove(post.page_id, post_id)
             return Response(status=status.HTTP_202_ACCEPTED)
         raise ValidationError("this not your post")
 
 
-class TagViewSet(viewsets.GenericViewSet,
+class TagViewSet(ReplicaReadMixin,
+                 viewsets.GenericViewSet,
                  mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  mixins.CreateModelMixin,
@@ -91,17 +216,52 @@ class TagViewSet(viewsets.GenericViewSet,
                  ):
     permission_classes = [IsAuthenticated | IsAdminUser]
     authentication_classes = (JWTAuthentication,)
+    replica_actions = ("list", "retrieve", "list_pages")
     queryset = Tag.objects.all()
+    querysets = {
+        "list": Tag.objects.only("id", "name"),
+        "retrieve": Tag.objects.only("id", "name"),
+    }
     serializer_classes = {
         "list": TagListAndRetrieveSerializer,
         "retrieve": TagListAndRetrieveSerializer,
         "update": TagUpdateSerializer,
         "create": TagCreateSerializer,
+        "list_pages": PageListSerializer,
+        "trending": TagTrendingSerializer,
     }
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, TagListAndRetrieveSerializer)
 
+    def get_queryset(self):
+        return self.querysets.get(self.action, self.queryset).all()
+
+    @action(methods=['GET', ], url_path="pages", url_name="pages", detail=True)
+    def list_pages(self, request, pk=None):
+        try:
+            tag_id = int(pk)
+        except ValueError:
+            raise NotFound()
+
+        tagged = Page.tags.through.objects.filter(tag_id=tag_id).values("page_id")
+        pages = self.paginate_queryset(
+            PageViewSet.querysets["list"].filter(id__in=tagged).order_by("-followers_count", "id")
+        )
+        # Only an empty result needs telling an untagged tag from a missing one
+        if not pages and not Tag.objects.filter(pk=tag_id).exists():
+            raise NotFound()
+        serializer = self.get_serializer(pages, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET', ], url_path="trending", url_name="trending", detail=False)
+    def trending(self, request):
+        count = bounded_query_param(request, "limit", TAG_TRENDING_SIZE, TAG_TRENDING_SIZE)
+        serializer = self.get_serializer(trending_tags.top(count), many=True)
+
+        return Response(serializer.data)
+
     def update(self, request, pk=None):
         tag = get_object_or_404(Tag, id=pk)
         serializer = self.get_serializer(data=request.data, instance=tag)
@@ -113,13 +273,16 @@ class TagViewSet(viewsets.GenericViewSet,
     def delete(self, request, pk=None):
         if request.user.role == "admin" or request.user.role == "moderator":
             tag = get_object_or_404(Tag, pk=pk)
+            tag_id = tag.id
             tag.delete()
+            trending_tags.update({tag_id})
 
             return Response(status=status.HTTP_202_ACCEPTED)
         raise ValidationError("permission denied")
 
 
 class PageViewSet(
+    ReplicaReadMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -128,24 +291,98 @@ class PageViewSet(
 ):
     permission_classes = [IsAuthenticated | IsAdminUser]
     authentication_classes = (JWTAuthentication,)
+    replica_actions = ("list", "retrieve", "search")
     queryset = Page.objects.all()
+    querysets = {
+        "list": Page.objects.only(
+            "id", "name", "owner_id", "followers_count", "follow_requests_count", "posts_count",
+        ),
+        "retrieve": Page.objects.only(
+            "id", "name", "image", "description", "owner_id",
+            "followers_count", "follow_requests_count", "posts_count",
+        ).prefetch_related(Prefetch("tags", queryset=Tag.objects.only("id"))),
+        "search": Page.objects.only("id", "name", "owner_id", "followers_count"),
+    }
     serializer_classes = {
         "list": PageListSerializer,
         "retrieve": PageRetrieveSerializer,
         "update": PageUpdateSerializer,
         "create": PageCreateSerializer,
+        "list_followers": PageFollowerSerializer,
+        "list_follow_requests": PageFollowerSerializer,
+        "search": PageSearchSerializer,
     }
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, PageListSerializer)
 
+    def get_queryset(self):
+        return self.querysets.get(self.action, self.queryset).all()
+
+    @action(methods=['GET', ], url_path="search", url_name="search", detail=False)
+    def search(self, request):
+        pages = self.get_queryset().filter(visible_to(request.user.id))
+        results = self.paginate_queryset(search_index.search(pages, request.query_params.get("q", "")))
+        serializer = self.get_serializer(results, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['POST', ], url_path="import", url_name="import", detail=False)
+    def import_pages(self, request):
+        return import_records(PageImporter, request)
+
+    @action(methods=['GET', ], url_path="export/posts", url_name="export-posts", detail=True)
+    def export_posts(self, request, pk=None):
+        return self.export(
+            request, pk, "posts",
+            Post.objects.filter(page_id=pk).order_by("id"),
+            {"id": "id", "content": "content", "reply_to": "reply_to_id", "created_at": "created_at"},
+        )
+
+    @action(methods=['GET', ], url_path="export/followers", url_name="export-followers", detail=True)
+    def export_followers(self, request, pk=None):
+        return self.export(
+            request, pk, "followers",
+            Page.followers.through.objects.filter(page_id=pk).order_by("user_id"),
+            {"id": "user_id", "username": "user__username"},
+        )
+
+    def export(self, request, pk, name, queryset, columns):
+        page = get_object_or_404(Page.objects.only("id", "owner_id"), pk=pk)
+        if request.user.id != page.owner_id:
+            return Response(status=status.HTTP_406_NOT_ACCEPTABLE)
+
+        output = request.query_params.get("output", "ndjson")
+        if output not in OUTPUTS:
+            return Response({"output": [f"Choose one of {', '.join(OUTPUTS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return export_response(queryset, columns, output, f"page-{page.id}-{name}")
+
+    @action(methods=['GET', ], url_path="followers", url_name="followers", detail=True)
+    def list_followers(self, request, pk=None):
+        page = get_object_or_404(Page, pk=pk)
+        followers = self.paginate_queryset(page.followers.order_by("id"))
+        serializer = self.get_serializer(followers, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['GET', ], url_path="follow-requests", url_name="follow-requests", detail=True)
+    def list_follow_requests(self, request, pk=None):
+        page = get_object_or_404(Page, pk=pk)
+        if request.user.id == page.owner_id:
+            follow_requests = self.paginate_queryset(page.follow_requests.order_by("id"))
+            serializer = self.get_serializer(follow_requests, many=True)
+
+            return self.get_paginated_response(serializer.data)
+        return Response(status=status.HTTP_406_NOT_ACCEPTABLE)
+
     @action(methods=['POST', ], url_path="make-page-private/(?P<uuid>[\w-]+)", url_name="make-page-private",
             detail=False)
     def make_page_private(self, request, uuid=None):
         page = Page.objects.get(id=uuid)
         if request.user.id == page.owner_id:
             page.is_private = True
-            page.save()
+            page.save(update_fields=["is_private"])
 
             return Response(status=status.HTTP_202_ACCEPTED)
         return Response(status=status.HTTP_406_NOT_ACCEPTABLE)
@@ -153,23 +390,21 @@ class PageViewSet(
     @action(methods=['GET', ], url_path="follow/(?P<uuid>[\w-]+)", url_name="follow", detail=False)
     def follow(self, request, uuid=None):
         page = Page.objects.get(id=uuid)
-        page.follow_requests.add(request.user.id)
-
-        page.save()
+        _, created = Page.follow_requests.through.objects.get_or_create(page_id=page.id, user_id=request.user.id)
+        if created:
+            adjust_page_counters(page.id, follow_requests_count=1)
 
         return Response(status=status.HTTP_202_ACCEPTED)
 
-    @action(methods=['POST', ], url_path="accept-follow/(?P<uuid>[\w-]+)", url_name="follow", detail=False)
+    @action(methods=['POST', ], url_path="accept-follow/(?P<uuid>[\w-]+)", url_name="accept-follow", detail=False)
     def accept_follow(self, request, uuid=None):
         page = Page.objects.get(id=uuid)
         if request.user.id == page.owner_id:
-            for user in request.data["unfollowed_users"]:
-                follower_object = User.objects.get(id=user)
-                page.followers.add(follower_object)
-                page.follow_requests.remove(follower_object)
-            page.save()
+            serializer = AcceptFollowSerializer(data=request.data, context={"page": page})
+            serializer.is_valid(raise_exception=True)
+            response_data = serializer.save()
 
-            return Response(status=status.HTTP_202_ACCEPTED)
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
         return Response(status=status.HTTP_406_NOT_ACCEPTABLE)
 
     def update(self, request, pk=None):
@@ -186,7 +421,23 @@ class PageViewSet(
     def delete(self, request, pk=None):
         page = get_object_or_404(Page, pk=pk)
         if request.user.id == page.owner_id:
+            timeline_store.drop_page(page.id)
+            thread_store.drop_page(page.id)
+            tag_ids = list(page.tags.values_list("id", flat=True))
             page.delete()
+            record_tag_changes(removed=tag_ids)
 
             return Response(status=status.HTTP_202_ACCEPTED)
         return Response(status=status.HTTP_406_NOT_ACCEPTABLE)
+
+
+class ModerationViewSet(viewsets.GenericViewSet):
+    permission_classes = (IsModerator,)
+    authentication_classes = (JWTAuthentication,)
+    serializer_class = ModerationSerializer
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(serializer.save(), status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,53 @@
+import time
+
+from contextlib import contextmanager
+
+import pytest
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.authentication.revocation import revocations
+from apps.content.search import search_index
+
+MAX_REQUEST_SECONDS = 1.0
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--check-request-time", action="store_true",
+        help=f"Fail budget tests whose request takes over {MAX_REQUEST_SECONDS}s of wall time",
+    )
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    """A replica alias for routing tests, mirroring the primary like configured replicas do"""
+    settings.DATABASES.setdefault("replica_0", {**settings.DATABASES["default"], "TEST": {"MIRROR": "default"}})
+
+
+@pytest.fixture
+def request_time_budget(request):
+    """
+    Wall time budget of a block, checked only with --check-request-time as
+    timings of a shared CI runner are too noisy to gate every run on
+    """
+    check = request.config.getoption("--check-request-time")
+
+    @contextmanager
+    def budget(seconds=MAX_REQUEST_SECONDS):
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        assert not check or elapsed < seconds, f"Request took {elapsed:.3f}s, over the {seconds}s budget"
+
+    return budget
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    for cache in caches.all():
+        cache.clear()
+    revocations.clear()
+    search_index.clear()
@@ -1,2 +1,19 @@
 #!/usr/bin/env bash
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+case "${SERVER_MODE:-dev}" in
+  asgi)
+    # Streamed exports block the event loop of their worker, keep them on wsgi workers
+    exec gunicorn innotter.asgi:application \
+      --worker-class uvicorn.workers.UvicornWorker \
+      --workers "${WEB_CONCURRENCY:-4}" \
+      --bind 0.0.0.0:8000
+    ;;
+  wsgi)
+    exec gunicorn innotter.wsgi:application \
+      --workers "${WEB_CONCURRENCY:-4}" \
+      --threads "${WEB_THREADS:-4}" \
+      --bind 0.0.0.0:8000
+    ;;
+  *)
+    python manage.py runserver 0.0.0.0:8000
+    ;;
+esac
@@ -0,0 +1,63 @@
+import time
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def shared_cache_aliases():
+    """(alias, contents) of the caches every worker must see the same data in"""
+    aliases = [
+        (settings.JWT_REVOCATION_CACHE_ALIAS, "Token revocations and used refresh tokens"),
+        (settings.AUTH_PRINCIPAL_CACHE_ALIAS, "Authenticated users"),
+    ]
+    if settings.REPLICA_DATABASES:
+        aliases.append((settings.REPLICA_STICKY_CACHE_ALIAS, "Users pinned to the primary database"))
+
+    return aliases
+
+
+def check_shared_caches():
+    """
+    Refuse to start when state shared by all workers sits in a per-process
+    cache, where every worker would keep its own copy. DEBUG serves from a
+    single development process, so local caches are fine there.
+    """
+    if settings.DEBUG:
+        return
+
+    for alias, contents in shared_cache_aliases():
+        backend = settings.CACHES[alias]["BACKEND"]
+        if backend in PROCESS_LOCAL_BACKENDS:
+            raise ImproperlyConfigured(
+                f"{contents} need a cache shared by all workers, but the {alias!r} cache is {backend}. "
+                f"Set CACHE_BACKEND and CACHE_LOCATION to a memcached server."
+            )
+
+
+@contextmanager
+def cache_lock(cache, key, timeout=5, attempts=50, wait=0.01):
+    """
+    Hold ``key`` of a shared cache as a lock around a read-modify-write of
+    other keys, yielding whether it was acquired within ``attempts`` tries.
+    Callers that did not get it fall back to deleting what they meant to
+    update. The lock expires after ``timeout`` seconds should its holder die.
+    """
+    for attempt in range(attempts):
+        if cache.add(key, True, timeout=timeout):
+            break
+        time.sleep(wait)
+    else:
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        cache.delete(key)
@@ -0,0 +1,96 @@
+import functools
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from innotter.db.pool import ConnectionPool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Postgres backend for persistent connections. A reused connection is
+    checked once per request before its first query when CONN_HEALTH_CHECKS
+    is set.
+
+    With POOL_SIZE set, the connections of a worker process come from a
+    ``ConnectionPool`` capped at that size: a thread borrows one for each
+    request and hands it back when the request ends, instead of keeping
+    its own open for CONN_MAX_AGE, and threads over the cap wait up to
+    POOL_TIMEOUT seconds for one to come back.
+    """
+
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+
+    @property
+    def pool(self):
+        size = self.settings_dict.get("POOL_SIZE") or 0
+        if size <= 0:
+            return None
+
+        with self.pools_lock:
+            if self.alias not in self.pools:
+                self.pools[self.alias] = ConnectionPool(
+                    size, self.settings_dict.get("POOL_TIMEOUT", 10), self.settings_dict["CONN_MAX_AGE"]
+                )
+            return self.pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            connection = super().get_new_connection(conn_params)
+        else:
+            check = self.pooled_connection_usable if self.settings_dict.get("CONN_HEALTH_CHECKS") else None
+            connection = pool.borrow(functools.partial(super().get_new_connection, conn_params), check)
+        self.health_check_done = True
+
+        return connection
+
+    def pooled_connection_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except base.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None:
+            super()._close()
+            return
+
+        # Closed inside a transaction, this wrapper keeps the connection until rollback, so it is not shared
+        reusable = (
+            not self.in_atomic_block
+            and not self.connection.closed
+            and self.connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        )
+        pool.give_back(self.connection, reusable)
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        if self.pool is not None and self.connection is not None and not self.in_atomic_block:
+            # Between requests the pool keeps the connection open, not this thread
+            self.close()
+            return
+
+        super().close_if_unusable_or_obsolete()
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+
+        super().ensure_connection()
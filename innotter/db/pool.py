@@ -0,0 +1,90 @@
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+
+class ConnectionPool:
+    """
+    Connections of one database shared by the threads of a worker process.
+    At most ``size`` are open at once. A thread borrows one for a request
+    and gives it back when the request ends, so threads idle between
+    requests hold none and cannot starve the busy ones. Connections older
+    than ``max_age`` seconds are closed rather than reused, and borrowers
+    wait up to ``timeout`` seconds for a connection when all are out.
+    """
+
+    def __init__(self, size, timeout, max_age=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.condition = threading.Condition()
+        self.idle = []
+        self.opened_at = {}
+        self.connecting = 0
+
+    def borrow(self, connect, check=None):
+        """An idle connection passing ``check``, or a new one from ``connect`` while under the cap"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self.condition:
+                connection = self._take(deadline)
+            if connection is None:
+                break
+            if check is None or check(connection):
+                return connection
+            self.discard(connection)
+
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.connecting -= 1
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            self.connecting -= 1
+            self.opened_at[connection] = time.monotonic()
+
+        return connection
+
+    def _take(self, deadline):
+        """An idle connection, or None with a slot reserved for opening one"""
+        while True:
+            while self.idle:
+                connection = self.idle.pop()
+                if not self._expired(connection):
+                    return connection
+                self._close(connection)
+
+            if len(self.opened_at) + self.connecting < self.size:
+                self.connecting += 1
+                return None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.condition.wait(remaining):
+                raise OperationalError(f"No free connection in the pool of {self.size} after {self.timeout}s")
+
+    def give_back(self, connection, reusable=True):
+        with self.condition:
+            if reusable and not self._expired(connection):
+                self.idle.append(connection)
+            else:
+                self._close(connection)
+            self.condition.notify()
+
+    def discard(self, connection):
+        with self.condition:
+            self._close(connection)
+            self.condition.notify()
+
+    def _expired(self, connection):
+        return self.max_age is not None and time.monotonic() - self.opened_at[connection] >= self.max_age
+
+    def _close(self, connection):
+        self.opened_at.pop(connection, None)
+        try:
+            connection.close()
+        except Exception:
+            pass
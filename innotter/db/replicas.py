@@ -0,0 +1,65 @@
+import contextvars
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.permissions import SAFE_METHODS
+
+read_from_replica = contextvars.ContextVar("read_from_replica", default=False)
+
+
+def _pin_key(user_id):
+    return f"primary-pin:{user_id}"
+
+
+def sticky_cache():
+    return caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+
+
+def pin_to_primary(user_id):
+    """
+    Keep the user's reads on the primary until replicas caught up with their
+    write. The pin is kept in a cache shared by all workers, see
+    check_shared_caches, as the next request may land on another one.
+    """
+    sticky_cache().set(_pin_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return sticky_cache().get(_pin_key(user_id), False)
+
+
+def request_user_id(request):
+    context = getattr(request, "auth_context", None)
+    if context is None:
+        return None
+    return context.payload["user_id"]
+
+
+class ReplicaReadMixin:
+    """
+    Lets safe-method ``replica_actions`` of a viewset read from replicas,
+    unless the requesting user wrote something in the last
+    REPLICA_STICKY_SECONDS. Successful unsafe requests start that window.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        user_id = request_user_id(request)
+        use_replica = (
+            request.method in SAFE_METHODS
+            and self.action_map.get(request.method.lower()) in self.replica_actions
+            and not (user_id is not None and is_pinned_to_primary(user_id))
+        )
+
+        token = read_from_replica.set(use_replica)
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            read_from_replica.reset(token)
+
+        if request.method not in SAFE_METHODS and user_id is not None and response.status_code < 400:
+            pin_to_primary(user_id)
+
+        return response
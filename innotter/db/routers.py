@@ -0,0 +1,26 @@
+import random
+
+from django.conf import settings
+
+from innotter.db.replicas import read_from_replica
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random replica from REPLICA_DATABASES while the current
+    request allows it (see ReplicaReadMixin), everything else to default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.REPLICA_DATABASES and read_from_replica.get():
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
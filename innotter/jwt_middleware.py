@@ -1,34 +1,26 @@
-import jwt
-
 from django.http import HttpResponse
 from django.utils.deprecation import MiddlewareMixin
-from django.utils.functional import SimpleLazyObject
 from django.contrib.auth.middleware import get_user
 
-from innotter.settings import JWT_SECRET
-from django.contrib.auth import get_user_model
+from apps.authentication.backends import AuthContext
 
-User = get_user_model()
+PUBLIC_PATHS = ("/login/", "/refresh/", "/revoke/", "/.well-known/jwks.json")
 
 
 class JWTAuthenticationMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        if request.get_full_path() != "/login/" and request.get_full_path() != "/refresh/":
+        if request.get_full_path() not in PUBLIC_PATHS:
             user = get_user(request)
 
             if user.is_authenticated:
                 return user
             jwt_token = request.META.get('HTTP_AUTHORIZATION', None)
             if jwt_token:
-
-                payload = jwt.decode(jwt_token.replace("Token ", ""), JWT_SECRET, algorithms=['HS256'])
-
                 try:
-                    User.objects.get(id=payload["user_id"])
+                    request.auth_context = AuthContext.from_token(jwt_token.replace("Token ", ""))
                     return None
 
                 except Exception as e:
                     return HttpResponse(f"Error: {e}")
             return HttpResponse("No JWT token provided")
         return None
-
@@ -15,6 +15,7 @@ import os
 
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 from innotter.parser import parse_bool
@@ -78,17 +79,57 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'innotter.wsgi.application'
 
+ASGI_APPLICATION = 'innotter.asgi.application'
+
+# Serve the hot read endpoints from async views, on by default in the ASGI serving mode
+ASYNC_READ_VIEWS = parse_bool(os.getenv('ASYNC_READ_VIEWS'), default=os.getenv('SERVER_MODE') == 'asgi')
+
+# Threads running ORM work for async views, which bounds their database connections too
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 8))
+
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'innotter.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB'),
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST'),
         'PORT': 5432,
+        'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': parse_bool(os.getenv('POSTGRES_CONN_HEALTH_CHECKS'), default=True),
+        # Set when connecting through pgbouncer in transaction mode, which
+        # cannot keep server-side cursors between transactions
+        'DISABLE_SERVER_SIDE_CURSORS': parse_bool(os.getenv('POSTGRES_PGBOUNCER')),
+        # Connections one worker process keeps open at most, 0 for one per thread
+        'POOL_SIZE': int(os.getenv('POSTGRES_POOL_SIZE', 0)),
+        'POOL_TIMEOUT': float(os.getenv('POSTGRES_POOL_TIMEOUT', 10)),
+    }
+}
+
+# Read replicas share the primary's credentials, in tests they mirror the primary
+for index, host in enumerate(os.getenv('POSTGRES_REPLICA_HOSTS', '').split()):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_STICKY_CACHE_ALIAS = 'default'
+
+DATABASE_ROUTERS = ['innotter.db.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 # Password validation
@@ -109,6 +150,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New and upgraded password hashes use the first hasher, the rest still verify older hashes
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'django.contrib.auth.hashers.PBKDF2PasswordHasher')
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    )
+    if hasher != PASSWORD_HASHER
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -140,6 +193,55 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
-JWT_SECRET = 'secret'
+JWT_KEYS_DIR = os.getenv('JWT_KEYS_DIR')
+# With a keyset, HS256 tokens without a kid are only accepted when asked for
+JWT_ACCEPT_HS256 = parse_bool(os.getenv('JWT_ACCEPT_HS256'), default=not JWT_KEYS_DIR)
+JWT_SECRET = os.getenv('JWT_SECRET') or ('secret' if DEBUG else None)
+if JWT_SECRET is None and JWT_ACCEPT_HS256:
+    raise ImproperlyConfigured("Set JWT_SECRET, or JWT_KEYS_DIR to sign tokens with a keyset")
+JWT_SIGNING_KEY_ID = os.getenv('JWT_SIGNING_KEY_ID')
+JWT_KEYS_RELOAD_SECONDS = int(os.getenv('JWT_KEYS_RELOAD_SECONDS', 60))
 JWT_ACCESS_TTL = 60 * 10
 JWT_REFRESH_TTL = 3600 * 24 * 7
+JWT_CHECK_ACCESS_REVOCATION = parse_bool(os.getenv('JWT_CHECK_ACCESS_REVOCATION'))
+JWT_REVOCATION_CACHE_ALIAS = 'default'
+JWT_REVOCATION_BLOOM_CAPACITY = int(os.getenv('JWT_REVOCATION_BLOOM_CAPACITY', 100000))
+JWT_REVOCATION_BLOOM_ERROR_RATE = 0.01
+JWT_REVOCATION_SYNC_SECONDS = float(os.getenv('JWT_REVOCATION_SYNC_SECONDS', 1))
+
+AUTH_PRINCIPAL_CACHE_ALIAS = 'default'
+AUTH_PRINCIPAL_CACHE_TTL = JWT_ACCESS_TTL
+
+FEED_FANOUT_ENABLED = parse_bool(os.getenv('FEED_FANOUT_ENABLED'))
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_TIMELINE_CACHE_ALIAS = 'default'
+FEED_TIMELINE_SIZE = int(os.getenv('FEED_TIMELINE_SIZE', 500))
+FEED_TIMELINE_TTL = 3600 * 24
+
+THREAD_CACHE_ALIAS = 'default'
+THREAD_CACHE_TTL = int(os.getenv('THREAD_CACHE_TTL', 3600))
+THREAD_MAX_DEPTH = int(os.getenv('THREAD_MAX_DEPTH', 20))
+THREAD_PAGE_SIZE = 100
+THREAD_MAX_POSTS = int(os.getenv('THREAD_MAX_POSTS', 500))
+
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'english')
+
+TAG_TRENDING_CACHE_ALIAS = 'default'
+TAG_TRENDING_SIZE = int(os.getenv('TAG_TRENDING_SIZE', 100))
+TAG_TRENDING_TTL = 3600
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+IMPORT_MAX_BATCH_SIZE = 10000
+IMPORT_MAX_ERRORS = 1000
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+LOGIN_HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', 2))
+LOGIN_HASH_MAX_PENDING = int(os.getenv('LOGIN_HASH_MAX_PENDING', 32))
+LOGIN_HASH_TIMEOUT = int(os.getenv('LOGIN_HASH_TIMEOUT', 10))
+
+MODERATION_MAX_IDS = 10000
+
+UNBLOCK_SWEEPER_IN_PROCESS = parse_bool(os.getenv('UNBLOCK_SWEEPER_IN_PROCESS'))
+UNBLOCK_SWEEP_BATCH_SIZE = int(os.getenv('UNBLOCK_SWEEP_BATCH_SIZE', 1000))
+UNBLOCK_SWEEP_MAX_SLEEP = int(os.getenv('UNBLOCK_SWEEP_MAX_SLEEP', 60))
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'innotter.settings')
 
 application = get_wsgi_application()
+
+from innotter.caches import check_shared_caches  # noqa: E402
+from innotter.settings import UNBLOCK_SWEEPER_IN_PROCESS  # noqa: E402
+
+check_shared_caches()
+
+if UNBLOCK_SWEEPER_IN_PROCESS:
+    from apps.content.sweeper import unblock_sweeper
+
+    unblock_sweeper.start()